@@ -1,137 +1,226 @@
 import os
-import re
-import time
+import sys
 import glob
-import tempfile
-from tqdm import tqdm
-from PIL import Image
-from PyPDF2 import PdfMerger
-
-def get_image_format():
-    """交互式选择图片格式"""
-    print("请选择要转换的图片格式：")
-    print("1. JPG/JPEG")
-    print("2. WEBP")
-    print("3. PNG")
-    print("4. 所有图片格式（JPG/JPEG/WEBP/PNG）")
-    
-    choice = input("请输入数字选择（1-4）：").strip()
-    format_map = {
-        '1': ['.jpg', '.jpeg'],
-        '2': ['.webp'],
-        '3': ['.png'],
-        '4': ['.jpg', '.jpeg', '.webp', '.png']
-    }
-    
-    while choice not in format_map:
-        print("⚠️ 无效输入，请重新选择")
-        choice = input("请输入数字选择（1-4）：").strip()
-    
-    return format_map[choice]
-
-def convert_images_to_pdf(images, output_pdf_path):
-    """将一批图像转换为 PDF"""
-    if not images:
-        return False
+import json
+import argparse
+from PIL import ImageColor
+from image2pdf import (DEFAULT_DISK_CACHE_SIZE, DEFAULT_READERS, ENGINES, JOB_ORDERS, NULL_TRACER, Converter, EncodeReport,
+                       NO_INPUT_ACTIONS, ImageOptions, StageSummary, Tracer, default_cache_dir, folder_outputs,
+                       open_trace_sink, parse_size)
+from image2pdf import parse_formats as parse_format_names
 
+# 退出码：0 全部成功（含跳过）；1 有文件夹转换失败、不存在或没有图片；2 参数错误（argparse、同名文件夹输出冲突）；
+# 3 没有可处理的文件夹；
+# 130 被 Ctrl-C 中断
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_NO_INPUT = 3
+EXIT_INTERRUPTED = 130
+
+# 未指定文件夹时默认处理的文件夹（相对当前目录）
+TARGET_FOLDERS = [
+    "folder1","folder2","folder3"
+]
+
+def parse_formats(text):
+    """解析 'jpg,png' 这样的格式列表，返回扩展名列表"""
     try:
-        images[0].convert('RGB').save(
-            output_pdf_path,
-            save_all=True,
-            append_images=[img.convert('RGB') for img in images[1:]],
-            resolution=100.0
-        )
-        return True
-    except Exception as e:
-        print(f"❌ 生成中间 PDF 失败: {output_pdf_path} - {str(e)}")
-        return False
-    
-def natural_sort_key(s):
-    """自然排序算法"""
-    return [int(text) if text.isdigit() else text.lower()
-            for text in re.split(r'(\d+)', s)]
-
-def process_folder(input_folder, output_pdf_path, formats, batch_size=50):
-    image_files = sorted(
-        [os.path.join(input_folder, f) for f in os.listdir(input_folder) 
-         if f.lower().endswith(tuple(formats))],
-        key=lambda x: natural_sort_key(os.path.basename(x)) 
-    )
-
-    if not image_files:
-        print(f"⏭️ 无 {formats} 文件: {input_folder}")
-        return
-
-    total_files = len(image_files)
-    print(f"📊 总计需处理: {total_files} 张图片")
-
-    temp_dir = tempfile.mkdtemp()
+        return parse_format_names(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def parse_color(text):
+    """校验颜色参数（'white'、'#f0f0f0' 等），原样返回字符串"""
+    try:
+        ImageColor.getrgb(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无法识别的颜色: {text}")
+    return text
+
+def parse_frames(text):
+    """解析帧选择：all 全部帧，first 只取第一帧，N 每 N 帧取一帧；返回 ImageOptions.frames 的值"""
+    text = text.strip().lower()
+    if text == 'all':
+        return 1
+    if text == 'first':
+        return 0
+    if text.isdigit() and int(text) >= 1:
+        return int(text)
+    raise argparse.ArgumentTypeError(f"无法识别的帧选择: {text}（可选 all、first 或正整数 N）")
+
+def parse_quality(text):
+    """JPEG 质量 1-95（更高的值只增大文件，Pillow 也不建议）"""
+    if not text.isdigit() or not 1 <= int(text) <= 95:
+        raise argparse.ArgumentTypeError(f"JPEG 质量应为 1-95 的整数: {text}")
+    return int(text)
+
+def parse_flate_level(text):
+    """Flate 压缩级别 0-9"""
+    if not text.isdigit() or not 0 <= int(text) <= 9:
+        raise argparse.ArgumentTypeError(f"Flate 压缩级别应为 0-9 的整数: {text}")
+    return int(text)
+
+def expand_folders(patterns):
+    """展开文件夹参数中的通配符（Windows 终端不会自动展开），只保留目录
+
+    没有匹配到任何目录的通配符原样保留，和不存在的路径一样报告为 missing。
+    """
+    folders = []
+    for pattern in patterns:
+        matches = [pattern]
+        if glob.has_magic(pattern):
+            matches = [path for path in sorted(glob.glob(pattern)) if os.path.isdir(path)] or [pattern]
+        for path in matches:
+            path = os.path.normpath(path)
+            if path not in folders:
+                folders.append(path)
+    return folders
+
+def parse_args(argv=None):
+    """命令行参数"""
+    parser = argparse.ArgumentParser(description="批量图片转 PDF：每个文件夹合并为一个 PDF")
+    parser.add_argument('folders', nargs='*',
+                        help=f"要转换的文件夹，支持通配符（默认 {' '.join(TARGET_FOLDERS)}）")
+    parser.add_argument('-o', '--output-dir', default='result',
+                        help="PDF 输出目录（默认 result）")
+    parser.add_argument('-f', '--formats', type=parse_formats, default=parse_formats('jpg,png,webp'),
+                        help="图片格式，逗号分隔（默认 jpg,png,webp）")
+    parser.add_argument('--engine', choices=ENGINES, default='stream',
+                        help="转换引擎：stream 流式写入（默认），merge 旧版中间 PDF 合并")
+    parser.add_argument('--workers', type=int, default=1,
+                        help=f"并行解码/编码的进程数，所有文件夹共享（默认 1，本机 {os.cpu_count()} 核）")
+    parser.add_argument('--readers', type=int, default=DEFAULT_READERS,
+                        help=f"每个文件夹的预读线程数，读盘与解码同时进行（默认 {DEFAULT_READERS}，0 为同步读取）")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="同时转换的文件夹数（默认 1）")
+    parser.add_argument('--order', choices=JOB_ORDERS, default='largest',
+                        help="文件夹调度顺序：largest 大的先做，smallest 小的先做，given 按列表顺序")
+    parser.add_argument('--max-memory', type=parse_size, default=None,
+                        help="在途图片的内存预算，如 2GB、512MB（默认不限制，按张数预取）")
+    parser.add_argument('--background', type=parse_color, default=None,
+                        help="把透明图片合成到该背景色（如 white、#f0f0f0）；默认保留透明度（PDF 软蒙版）")
+    parser.add_argument('--max-dpi', type=int, default=None,
+                        help="按图片自带的 DPI 计算页面尺寸，超过该分辨率的图片缩小到该分辨率（如 150）")
+    parser.add_argument('--max-size', type=int, default=None,
+                        help="图片最长边超过该像素数时等比缩小，页面尺寸不变（如 2000）")
+    parser.add_argument('--frames', type=parse_frames, default=1,
+                        help="多帧图片（动图 WEBP/GIF、多页 TIFF）每帧一页：all 全部帧（默认），first 只取第一帧，N 每 N 帧取一帧")
+    parser.add_argument('--quality', type=parse_quality, default=75,
+                        help="需要重新编码的图片（有损 WEBP、透明 PNG、缩小后的图片）的 JPEG 质量 1-95（默认 75）；无损 WEBP 始终用 Flate 无损编码")
+    parser.add_argument('--optimize', action='store_true',
+                        help="JPEG 优化哈夫曼表、Flate 用最高压缩级别 9（除非指定 --flate-level）：输出更小，编码更慢")
+    parser.add_argument('--flate-level', type=parse_flate_level, default=None,
+                        help="无损 Flate 编码（无损 WEBP、透明度蒙版）的压缩级别 0-9：默认 1 最快，越高越慢、通常越小")
+    parser.add_argument('--progressive', action='store_true',
+                        help="重新编码的 JPEG 使用渐进式")
+    parser.add_argument('--encode-report', metavar='FILE',
+                        help="把每张重新编码的图片的编码方式、像素数、耗时和输出字节数写成 CSV，结束时按编码方式汇总")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="忽略增量清单和上次中断留下的断点，所有文件夹完整重新转换")
+    parser.add_argument('--no-dedup', action='store_true',
+                        help="不按内容去重：重复的图片每页各写一份（默认只编码一次，多页共用）；同时不使用磁盘缓存")
+    parser.add_argument('--cache-dir', default=default_cache_dir(),
+                        help="编码结果的磁盘缓存目录，跨运行复用（默认 %(default)s）")
+    parser.add_argument('--cache-size', type=parse_size, default=DEFAULT_DISK_CACHE_SIZE,
+                        help="磁盘缓存大小上限，超出时淘汰最久未用的条目，如 2GB（默认 1GB，0 为不使用磁盘缓存）")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="记录各阶段计时事件：.json 为 Chrome trace（chrome://tracing / Perfetto），其余为 JSON-lines")
+    parser.add_argument('--profile', action='store_true',
+                        help="结束时打印各阶段耗时汇总（墙钟、CPU、字节）")
+    parser.add_argument('--json', action='store_true',
+                        help="结束时向标准输出打印 JSON 汇总，日志改写到标准错误")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # JSON 模式下标准输出只留给汇总结果
+    log_file = sys.stderr if args.json else sys.stdout
+
+    def log(message):
+        print(message, file=log_file)
+
+    folders = expand_folders(args.folders or TARGET_FOLDERS)
+    output_dir = os.path.abspath(args.output_dir)
     try:
-        merger = PdfMerger()
-        batch_count = 0
-
-        with tqdm(total=total_files, desc="🖼️ 加载图片", unit="img") as pbar:
-            for i in range(0, total_files, batch_size):
-                batch_files = image_files[i:i+batch_size]
-                images = []
-                
-                for file_path in batch_files:
-                    try:
-                        with Image.open(file_path) as img:
-                            images.append(img.copy())
-                        pbar.update(1)
-                    except Exception as e:
-                        print(f"\n⚠️ 加载失败: {os.path.basename(file_path)} - {str(e)}")
-                        pbar.update(1)
-
-                temp_pdf = os.path.join(temp_dir, f"temp_{batch_count}.pdf")
-                if convert_images_to_pdf(images, temp_pdf):
-                    with open(temp_pdf, 'rb') as f:
-                        merger.append(f)
-                    batch_count += 1
-                    print(f"\n🔖 已生成第 {batch_count} 个中间 PDF（本批 {len(batch_files)} 张）")
-
-                for img in images:
-                    img.close()
-
-        print(f"\n📂 开始合并 {batch_count} 个中间 PDF...")
-        start_time = time.time()
-        with open(output_pdf_path, 'wb') as f:
-            merger.write(f)
-        print(f"✅ 合并完成！耗时 {time.time()-start_time:.1f} 秒")
+        outputs = folder_outputs(folders, output_dir)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    # 阶段计时：未开启时用空 tracer，几乎没有开销
+    summary_sink = StageSummary() if args.profile else None
+    encode_sink = EncodeReport(args.encode_report) if args.profile or args.encode_report else None
+    sinks = [sink for sink in (summary_sink, encode_sink, open_trace_sink(args.trace) if args.trace else None) if sink]
+    tracer = Tracer(*sinks) if sinks else NULL_TRACER
 
+    options = ImageOptions(background=args.background, max_dpi=args.max_dpi, max_size=args.max_size,
+                           frames=args.frames, quality=args.quality, optimize=args.optimize,
+                           progressive=args.progressive, flate_level=args.flate_level)
+    # 增量清单：未变化的文件夹直接跳过，只新增了图片的文件夹追加页面；
+    # 去重缓存在所有文件夹间共享，磁盘缓存跨运行复用编码结果
+    converter = Converter(engine=args.engine, workers=args.workers, max_jobs=args.jobs, order=args.order,
+                          max_memory=args.max_memory, readers=args.readers, options=options,
+                          dedup=not args.no_dedup, cache_dir=args.cache_dir, cache_size=args.cache_size,
+                          incremental=not args.no_cache, tracer=tracer, log_callback=log)
+    try:
+        with converter:
+            os.makedirs(output_dir, exist_ok=True)
+            finished = converter.run(converter.plan(outputs, args.formats))
+    except KeyboardInterrupt:
+        # 各任务已在当前图片之后停下并保存断点
+        log("⏹️ 已中断，重新运行相同的命令即可从断点继续")
+        return EXIT_INTERRUPTED
     finally:
-        merger.close()
-        for f in glob.glob(os.path.join(temp_dir, '*')):
-            try:
-                os.remove(f)
-            except PermissionError:
-                time.sleep(0.1)
-                os.remove(f)
-        os.rmdir(temp_dir)
-
-def main():
-    # 选择图片格式1
-    selected_formats = get_image_format()
-    
-    current_dir = os.getcwd()
-    output_dir = os.path.join(current_dir, "result")
-    os.makedirs(output_dir, exist_ok=True)
-
-    # 配置需要处理的文件夹（修改这里）
-    TARGET_FOLDERS = [
-        "folder1","folder2","folder3"
-    ]
-    
-    for folder_name in TARGET_FOLDERS:
-        input_folder = os.path.join(current_dir, folder_name)
-        output_pdf = os.path.join(output_dir, f"{folder_name}.pdf")
-        
-        if os.path.isdir(input_folder):
-            print(f"\n📂 正在处理: {folder_name}")
-            process_folder(input_folder, output_pdf, selected_formats, batch_size=50)
-        else:
-            print(f"⚠️ 跳过不存在的文件夹: {folder_name}")
+        tracer.close()
+    cache = converter.cache
+    if summary_sink is not None:
+        log(f"⏱️ 阶段耗时:\n{summary_sink.report()}")
+    if encode_sink is not None and encode_sink.codecs:
+        log(f"🗜️ 重新编码:\n{encode_sink.report()}")
+    if args.encode_report:
+        log(f"💾 逐张编码记录已写入 {args.encode_report}")
+    if args.trace:
+        log(f"💾 计时事件已写入 {args.trace}")
+    if cache is not None and cache.hits:
+        log(f"♻️ 重复图片复用已编码结果 {cache.hits} 次")
+    if cache is not None and cache.disk is not None and cache.disk.hits:
+        log(f"♻️ 磁盘缓存命中 {cache.disk.hits} 次（{cache.disk.cache_dir}）")
+
+    # 不存在或没有图片的文件夹算失败，调度脚本才能发现写错的路径
+    if all(job.action in NO_INPUT_ACTIONS for job in finished):
+        exit_code = EXIT_NO_INPUT
+    elif all(job.success for job in finished):
+        exit_code = EXIT_OK
+    else:
+        exit_code = EXIT_FAILED
+
+    if args.json:
+        summary = {
+            'exit_code': exit_code,
+            'folders': [{
+                'folder': job.input_folder,
+                'output': job.output_pdf_path,
+                'action': job.action,
+                'success': job.success,
+                'images': len(job.image_files),
+                'pages': job.pages,
+                'bytes': job.output_bytes,
+                'seconds': round(job.seconds, 3),
+            } for job in finished],
+        }
+        print(json.dumps(summary, ensure_ascii=False))
+    else:
+        for job in finished:
+            if job.action == 'skip':
+                continue
+            if job.action in NO_INPUT_ACTIONS:
+                log(f"❌ {job.name}: {'文件夹不存在' if job.action == 'missing' else '没有可转换的图片'}")
+                continue
+            status = "✅" if job.success else "❌"
+            log(f"{status} {job.name}: {job.pages} 页，{job.output_bytes / 1024 / 1024:.1f} MB，耗时 {job.seconds:.1f} 秒")
+
+    return exit_code
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
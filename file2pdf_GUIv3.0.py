@@ -1,236 +1,256 @@
 import os
-import re
-import glob
-import tempfile
+import time
 import threading
-from tqdm import tqdm
-from PIL import Image
-from PyPDF2 import PdfMerger
-import PySimpleGUI as sg
+import multiprocessing
+from image2pdf import (ENGINES, JOB_ORDERS, NO_INPUT_ACTIONS, ConversionCancelled, ConversionControl, Converter, Telemetry,
+                       folder_outputs, parse_size)
 
-sg.theme("LightGrey1")
-
-# 自然排序算法
-def natural_sort_key(s):
-    return [int(text) if text.isdigit() else text.lower() 
-            for text in re.split(r'(\d+)', s)]
-
-# 核心转换函数
-def process_folder(input_folder, output_pdf, formats, progress_callback, log_callback):
-    try:
-        image_files = sorted(
-            [os.path.join(input_folder, f) for f in os.listdir(input_folder)
-             if f.lower().endswith(tuple(formats))],
-            key=lambda x: natural_sort_key(os.path.basename(x))
-        )
-
-        if not image_files:
-            log_callback(f"⏭️ 无 {formats} 文件: {input_folder}")
-            return False
-
-        total_files = len(image_files)
-        log_callback(f"📊 总计需处理: {total_files} 张图片")
-
-        temp_dir = tempfile.mkdtemp()
-        merger = PdfMerger()
-        batch_count = 0
-        batch_size = 50
-
-        try:
-            with tqdm(total=total_files, desc="处理进度") as pbar:
-                for i in range(0, total_files, batch_size):
-                    batch_files = image_files[i:i+batch_size]
-                    images = []
-                    
-                    for file_path in batch_files:
-                        try:
-                            with Image.open(file_path) as img:
-                                images.append(img.copy())
-                            pbar.update(1)
-                            progress = (i + len(images)) / total_files * 100
-                            progress_callback(progress)
-                        except Exception as e:
-                            log_callback(f"⚠️ 加载失败: {os.path.basename(file_path)} - {str(e)}")
-                            pbar.update(1)
-
-                    temp_pdf = os.path.join(temp_dir, f"temp_{batch_count}.pdf")
-                    if convert_images_to_pdf(images, temp_pdf, log_callback):
-                        with open(temp_pdf, 'rb') as f:
-                            merger.append(f)
-                        batch_count += 1
-                        log_callback(f"🔖 生成第 {batch_count} 个中间PDF（本批 {len(batch_files)} 张）")
-
-                    for img in images:
-                        img.close()
-
-            with open(output_pdf, 'wb') as f:
-                merger.write(f)
-            log_callback("✅ 合并完成！")
-
-        finally:
-            merger.close()
-            for f in glob.glob(os.path.join(temp_dir, '*')):
-                try:
-                    os.remove(f)
-                except Exception as e:
-                    log_callback(f"⚠️ 临时文件删除失败: {str(e)}")
-            os.rmdir(temp_dir)
-
-        return True
-
-    except Exception as e:
-        log_callback(f"❌ 发生严重错误: {str(e)}")
-        return False
-
-def convert_images_to_pdf(images, output_pdf_path, log_callback):
-    try:
-        if not images:
-            return False
-
-        images[0].convert('RGB').save(
-            output_pdf_path,
-            save_all=True,
-            append_images=[img.convert('RGB') for img in images[1:]],
-            resolution=100.0
-        )
-        return True
-    except Exception as e:
-        log_callback(f"❌ PDF生成失败: {os.path.basename(output_pdf_path)} - {str(e)}")
-        return False
-
-# 修正后的GUI布局
-layout = [
-    [sg.Text('添加文件夹', size=(10,1)),
-     sg.Input(key='-FOLDER-', enable_events=True, visible=False),
-     sg.FolderBrowse('浏览', target='-FOLDER-'),
-     sg.Button('清空列表', key='-CLEAR-')],
-    [sg.Listbox([], size=(70,5), key='-FOLDER LIST-')],
-    [sg.Text('输出目录', size=(10,1)), sg.Input(key='-OUTPUT-'), sg.FolderBrowse()],
-    [sg.Text('文件格式', size=(10,1)), 
-     sg.Combo(['JPG/JPEG', 'PNG', 'WEBP', '所有格式'], 
-              default_value='JPG/JPEG', key='-FORMAT-')],
-    [sg.ProgressBar(100, size=(50,20), key='-PROGRESS-')],
-    [sg.Multiline(size=(70,15), key='-LOG-', autoscroll=True, disabled=True)],
-    [sg.Button('开始转换', key='-START-'), sg.Exit()]
-]
-
-window = sg.Window('批量图片转PDF工具 v4.2', layout, finalize=True)
+# 界面每秒最多刷新进度和日志的次数
+UPDATES_PER_SECOND = 10
 
 # 全局变量
+# PySimpleGUI（连带 tkinter）在 main() 里才导入：进程池子进程（Windows spawn）会重新导入本模块，不必每个都加载界面库
+sg = None
+window = None
 current_folders = []
 is_running = False
+# 当前转换的控制对象：暂停/继续/取消按钮通过它通知转换线程，在下一张图片或下一批之前生效
+control = None
+# 转换线程只把进度和日志记进限频通道，由事件循环定时取走，不再每张图片发一个窗口事件
+telemetry = Telemetry()
 
-# 新增线程安全的事件队列
 def gui_log(message):
-    window.write_event_value('-LOG-', message)
+    telemetry.log(message)
 
 def gui_progress(percent):
-    window.write_event_value('-PROGRESS-', percent)
+    telemetry.progress(percent)
+
+def flush_telemetry():
+    """把累积的进度和日志一次性刷到界面上"""
+    percent, logs, dropped = telemetry.drain()
+    if dropped:
+        logs.insert(0, f"…… 省略 {dropped} 条日志")
+    if logs:
+        window['-LOG-'].print('\n'.join(logs))
+        window['-LOG-'].set_vscroll_position(1)
+    if percent is not None:
+        window['-PROGRESS-'].update_bar(percent)
 
 # 修改后的转换线程
-def conversion_thread(input_folders, output_dir, formats):
+def conversion_thread(input_folders, output_dir, formats, engine, workers, max_jobs, order, use_cache,
+                      max_memory, control):
     global is_running
     is_running = True
     try:
-        total = len(input_folders)
-        for idx, folder in enumerate(input_folders, 1):
-            folder_name = os.path.basename(folder)
-            output_pdf = os.path.join(output_dir, f"{folder_name}.pdf")
-            gui_log(f"\n📂 正在处理文件夹 ({idx}/{total}): {folder_name}")
-            
-            # 调用核心处理
-            success = process_folder(
-                input_folder=folder,
-                output_pdf=output_pdf,
-                formats=formats,
-                progress_callback=lambda x: gui_progress(x),
-                log_callback=lambda m: gui_log(m)
-            )
-            
-            if success:
-                gui_log(f"✅ 成功生成：{os.path.basename(output_pdf)}")
+        # 增量清单：未变化的文件夹直接跳过
+        converter = Converter(engine=engine, workers=workers, max_jobs=max_jobs, order=order, max_memory=max_memory,
+                              incremental=use_cache, log_callback=gui_log)
+        jobs = converter.plan(folder_outputs(input_folders, output_dir), formats)
+        total_files = sum(len(job.image_files) for job in jobs) or 1
+        # 各文件夹进度按图片数加权汇总到总进度条（预先放好键，避免多线程改动字典大小）
+        job_done = {job: 0.0 for job in jobs}
+
+        def job_progress(job, percent):
+            job_done[job] = percent * len(job.image_files)
+            gui_progress(sum(job_done.values()) / total_files)
+
+        # 调用核心处理
+        converter.progress_callback = job_progress
+        with converter:
+            finished = converter.run(jobs, control)
+
+        for idx, job in enumerate(finished, 1):
+            if job.action == 'skip':
+                continue
+            if job.action in NO_INPUT_ACTIONS:
+                gui_log(f"❌ {'文件夹不存在' if job.action == 'missing' else '没有可转换的图片'}：{job.name}")
+            elif job.success:
+                gui_log(f"✅ 成功生成 ({idx}/{len(jobs)})：{os.path.basename(job.output_pdf_path)}，耗时 {job.seconds:.1f} 秒")
             else:
-                gui_log(f"❌ 转换失败：{folder_name}")
+                gui_log(f"❌ 转换失败：{job.name}")
         
         window.write_event_value('-FINISH-', '所有转换完成!')
         
+    except ConversionCancelled:
+        if control.keep_partial and use_cache:
+            gui_log("⏹️ 已取消，已完成的部分保留为断点，下次转换相同的文件夹会从这里继续")
+        elif control.keep_partial:
+            # 不勾选增量转换时不读断点，下次会从头开始
+            gui_log("⏹️ 已取消，已完成的部分保留为断点；勾选“跳过未变化的文件夹”后再转换相同的文件夹才会从这里继续")
+        else:
+            gui_log("⏹️ 已取消，未完成的输出已删除")
     except Exception as e:
         gui_log(f"❌ 发生全局错误：{str(e)}")
     finally:
         is_running = False
         window.write_event_value('-DONE-', '')
 
-# 修正后的事件循环
-while True:
-    event, values = window.read()
+# 修正后的GUI布局
+def build_window():
+    layout = [
+        [sg.Text('添加文件夹', size=(10,1)),
+         sg.Input(key='-FOLDER-', enable_events=True, visible=False),
+         sg.FolderBrowse('浏览', target='-FOLDER-'),
+         sg.Button('清空列表', key='-CLEAR-')],
+        [sg.Listbox([], size=(70,5), key='-FOLDER LIST-')],
+        [sg.Text('输出目录', size=(10,1)), sg.Input(key='-OUTPUT-'), sg.FolderBrowse()],
+        [sg.Text('文件格式', size=(10,1)), 
+         sg.Combo(['JPG/JPEG', 'PNG', 'WEBP', 'GIF', 'TIFF', '所有格式'], 
+                  default_value='JPG/JPEG', key='-FORMAT-')],
+        [sg.Text('转换引擎', size=(10,1)),
+         sg.Combo(list(ENGINES), default_value='stream', key='-ENGINE-', readonly=True),
+         sg.Text('并行进程数'),
+         sg.Spin(list(range(1, (os.cpu_count() or 1) + 1)), initial_value=1, key='-WORKERS-', size=(4,1))],
+        [sg.Text('同时转换', size=(10,1)),
+         sg.Spin(list(range(1, 9)), initial_value=1, key='-JOBS-', size=(4,1)),
+         sg.Text('个文件夹，调度顺序'),
+         sg.Combo(list(JOB_ORDERS), default_value='largest', key='-ORDER-', readonly=True)],
+        [sg.Text('内存预算', size=(10,1)), sg.Input('', key='-MEMORY-', size=(10,1)),
+         sg.Text('如 2GB，留空不限制'),
+         sg.Checkbox('跳过未变化的文件夹（只追加新增图片）', default=True, key='-CACHE-')],
+        [sg.ProgressBar(100, size=(50,20), key='-PROGRESS-')],
+        [sg.Multiline(size=(70,15), key='-LOG-', autoscroll=True, disabled=True)],
+        [sg.Button('开始转换', key='-START-'),
+         sg.Button('暂停', key='-PAUSE-', disabled=True),
+         sg.Button('取消', key='-CANCEL-', disabled=True),
+         sg.Exit()]
+    ]
+
+    # 拦截关闭按钮：转换中关闭窗口时先取消转换、保存断点再退出
+    return sg.Window('批量图片转PDF工具 v4.2', layout, finalize=True, enable_close_attempted_event=True)
+
+def set_running(running):
+    window['-START-'].update(disabled=running)
+    window['-PAUSE-'].update('暂停', disabled=not running)
+    window['-CANCEL-'].update(disabled=not running)
+
+def main():
+    global sg, window, current_folders, control
+    import PySimpleGUI as sg
+    # 主题和窗口只在启动界面时创建，导入本模块没有副作用
+    sg.theme("LightGrey1")
+    window = build_window()
+    interval = 1 / UPDATES_PER_SECOND
+    last_flush = 0.0
+    closing = False  # 已请求退出，等转换线程停下后关闭窗口
+
+    # 修正后的事件循环：带超时读取，转换期间定时刷新进度和日志
+    while True:
+        event, values = window.read(timeout=int(interval * 1000))
     
-    if event in (sg.WINDOW_CLOSED, 'Exit'):
-        if is_running:
-            sg.popup('请等待当前转换完成！')
-            continue
-        break
+        if event in (sg.WINDOW_CLOSED, sg.WINDOW_CLOSE_ATTEMPTED_EVENT, 'Exit'):
+            if is_running:
+                if not closing and sg.popup_yes_no('正在转换，要取消并退出吗？\n已完成的部分会保留，下次可以继续。') == 'Yes':
+                    closing = True
+                    control.cancel(keep_partial=True)
+                continue
+            break
+
+        if time.monotonic() - last_flush >= interval:
+            flush_telemetry()
+            last_flush = time.monotonic()
         
-    if event == '-FOLDER-':
-        new_path = values['-FOLDER-']
-        if new_path:
-            normalized_path = os.path.normpath(new_path)
-            if normalized_path not in current_folders:
-                current_folders.append(normalized_path)
-                window['-FOLDER LIST-'].update(current_folders)
-            window['-FOLDER-'].update('')
+        if event == '-FOLDER-':
+            new_path = values['-FOLDER-']
+            if new_path:
+                normalized_path = os.path.normpath(new_path)
+                if normalized_path not in current_folders:
+                    current_folders.append(normalized_path)
+                    window['-FOLDER LIST-'].update(current_folders)
+                window['-FOLDER-'].update('')
             
-    if event == '-CLEAR-':
-        current_folders = []
-        window['-FOLDER LIST-'].update(current_folders)
+        if event == '-CLEAR-':
+            current_folders = []
+            window['-FOLDER LIST-'].update(current_folders)
         
-    if event == '-START-':
-        if is_running:
-            continue
+        if event == '-START-':
+            if is_running:
+                continue
             
-        input_folders = current_folders
-        output_dir = values['-OUTPUT-']
-        format_choice = values['-FORMAT-']
+            input_folders = current_folders
+            output_dir = values['-OUTPUT-']
+            format_choice = values['-FORMAT-']
         
-        if not input_folders:
-            sg.popup_error('请至少选择一个输入文件夹!')
-            continue
-        if not output_dir:
-            sg.popup_error('请选择输出目录!')
-            continue
+            if not input_folders:
+                sg.popup_error('请至少选择一个输入文件夹!')
+                continue
+            if not output_dir:
+                sg.popup_error('请选择输出目录!')
+                continue
         
-        try:
-            os.makedirs(output_dir, exist_ok=True)
-        except Exception as e:
-            sg.popup_error(f'创建输出目录失败: {str(e)}')
-            continue
+            try:
+                folder_outputs(input_folders, output_dir)
+            except ValueError as e:
+                sg.popup_error(str(e))
+                continue
+
+            try:
+                os.makedirs(output_dir, exist_ok=True)
+            except Exception as e:
+                sg.popup_error(f'创建输出目录失败: {str(e)}')
+                continue
         
-        format_map = {
-            'JPG/JPEG': ['.jpg', '.jpeg'],
-            'PNG': ['.png'],
-            'WEBP': ['.webp'],
-            '所有格式': ['.jpg', '.jpeg', '.png', '.webp']
-        }
-        selected_formats = format_map[format_choice]
+            format_map = {
+                'JPG/JPEG': ['.jpg', '.jpeg'],
+                'PNG': ['.png'],
+                'WEBP': ['.webp'],
+                'GIF': ['.gif'],
+                'TIFF': ['.tif', '.tiff'],
+                '所有格式': ['.jpg', '.jpeg', '.png', '.webp', '.gif', '.tif', '.tiff']
+            }
+            selected_formats = format_map[format_choice]
+            engine = values['-ENGINE-']
+            workers = int(values['-WORKERS-'])
+            max_jobs = int(values['-JOBS-'])
+            order = values['-ORDER-']
+            use_cache = values['-CACHE-']
+            try:
+                max_memory = parse_size(values['-MEMORY-']) if values['-MEMORY-'].strip() else None
+            except ValueError as e:
+                sg.popup_error(str(e))
+                continue
         
-        window['-START-'].update(disabled=True)
-        threading.Thread(
-            target=conversion_thread,
-            args=(input_folders, output_dir, selected_formats),
-            daemon=True
-        ).start()
-    
-    # 处理线程事件
-    if event == '-LOG-':
-        window['-LOG-'].print(values[event])
-        window['-LOG-'].set_vscroll_position(1)
-    
-    if event == '-PROGRESS-':
-        window['-PROGRESS-'].update_bar(values[event])
+            control = ConversionControl()
+            set_running(True)
+            threading.Thread(
+                target=conversion_thread,
+                args=(input_folders, output_dir, selected_formats, engine, workers, max_jobs, order, use_cache,
+                      max_memory, control),
+                daemon=True
+            ).start()
+
+        if event == '-PAUSE-' and is_running:
+            if control.paused:
+                control.resume()
+                window['-PAUSE-'].update('暂停')
+                gui_log("▶️ 继续转换")
+            else:
+                control.pause()
+                window['-PAUSE-'].update('继续')
+                gui_log("⏸️ 已暂停（当前图片处理完后停下）")
+
+        if event == '-CANCEL-' and is_running and not control.cancelled:
+            answer = sg.popup_yes_no('保留已完成的部分，下次从断点继续？\n选“否”将删除未完成的输出。', title='取消转换')
+            if answer in ('Yes', 'No'):  # 关掉对话框视为不取消
+                control.cancel(keep_partial=(answer == 'Yes'))
+                window['-PAUSE-'].update(disabled=True)
+                window['-CANCEL-'].update(disabled=True)
+                gui_log("⏹️ 正在取消……")
     
-    if event == '-FINISH-':
-        sg.popup_notify(values[event])
+        # 处理线程事件（结束前先刷出剩余的日志）
+        if event == '-FINISH-':
+            flush_telemetry()
+            sg.popup_notify(values[event])
     
-    if event == '-DONE-':
-        window['-START-'].update(disabled=False)
+        if event == '-DONE-':
+            flush_telemetry()
+            set_running(False)
+            if closing:
+                break
+
+    window.close()
 
-window.close()
\ No newline at end of file
+if __name__ == "__main__":
+    # 进程池子进程会重新导入本模块（Windows spawn），窗口只能在主进程创建；打包的 exe 需要 freeze_support
+    multiprocessing.freeze_support()
+    main()
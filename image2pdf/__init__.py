@@ -0,0 +1,15 @@
+"""Image2PDF-Pro 核心转换引擎，供 file2pdf.py 与 GUI 共用；其他程序可直接 import 后用 Converter 在进程内转换"""
+from .trace import Tracer, NULL_TRACER, JsonLinesSink, ChromeTraceSink, StageSummary, EncodeReport, open_trace_sink
+from .pdfwriter import PdfImage, PdfStreamWriter
+from .images import ImageHeader, ImageOptions, DEFAULT_OPTIONS, read_jpeg_info, read_image_header, load_pdf_image, estimate_memory
+from .budget import Budget, parse_size
+from .scan import ImageEntry, natural_sort_key, iter_image_entries, scan_folder
+from .core import ENGINES, DEFAULT_READERS, list_image_files, iter_image_files, process_folder, convert_files
+from .manifest import MANIFEST_NAME, Manifest
+from .checkpoint import Checkpoint
+from .dedup import DEFAULT_CACHE_SIZE, CACHE_MEMORY_SHARE, ImageCache, content_hash, reserve_cache_memory
+from .diskcache import DEFAULT_DISK_CACHE_SIZE, DiskCache, default_cache_dir
+from .telemetry import Telemetry
+from .control import ConversionCancelled, ConversionControl
+from .scheduler import JOB_ORDERS, NO_INPUT_ACTIONS, FolderJob, check_outputs, plan_jobs, run_jobs
+from .converter import DEFAULT_FORMATS, FORMAT_MAP, Converter, folder_outputs, parse_formats
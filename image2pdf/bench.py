@@ -0,0 +1,382 @@
+"""性能基准：生成合成图片语料，分阶段计时并输出可对比的 JSON 结果
+
+用法：
+    python -m image2pdf.bench --files 500 --output bench.json
+    python -m image2pdf.bench --files 500 --compare bench.json   # 与上次结果对比，变慢超过阈值时退出码为 1
+    python -m image2pdf.bench --startup-only --startup-budget 150   # 只测启动（导入）耗时，超出预算时退出码为 1
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+import multiprocessing
+from queue import Empty
+import PIL
+from PIL import Image, ImageDraw
+
+from .core import ENGINES, convert_files
+from .scan import scan_folder
+from .trace import StageSummary, Tracer
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不统计峰值内存
+    resource = None
+
+# 语料类型：(名称, 扩展名, 模式, 保存参数)
+CORPUS_KINDS = {
+    'jpg': ('.jpg', 'RGB', {'quality': 90}),
+    'jpg-gray': ('.jpg', 'L', {'quality': 90}),
+    'png': ('.png', 'RGB', {}),
+    'png-alpha': ('.png', 'RGBA', {}),
+    'png-palette': ('.png', 'P', {}),
+    'webp': ('.webp', 'RGB', {'quality': 80}),
+    'webp-alpha': ('.webp', 'RGBA', {'lossless': True}),
+}
+DEFAULT_KINDS = ('jpg', 'png', 'png-alpha', 'png-palette', 'webp', 'webp-alpha')
+DEFAULT_SIZES = ((800, 600), (1600, 1200))
+FORMATS = ['.jpg', '.jpeg', '.png', '.webp']
+# 分阶段计时报告的引擎阶段（来自引擎自己的 tracer 事件）；merge 引擎的阶段加 merge_ 前缀
+STREAM_STAGES = ('read', 'passthrough', 'decode', 'resize', 'convert', 'encode', 'write')
+MERGE_STAGES = ('load', 'temp_pdf', 'merge_append', 'merge_write')
+# 导入 image2pdf 时不应加载的重依赖（只在用到的代码路径里按需导入）
+LAZY_MODULES = ('tqdm', 'PyPDF2', 'PySimpleGUI')
+DEFAULT_STARTUP_BUDGET_MS = 150
+
+def parse_sizes(text):
+    """解析 '800x600,1600x1200'"""
+    return tuple(tuple(int(v) for v in item.lower().split('x')) for item in text.split(','))
+
+def make_image(kind, size, rng):
+    """生成一张带渐变、色块和噪点的合成图片（比纯色图更接近真实压缩率）"""
+    _, mode, _ = CORPUS_KINDS[kind]
+    width, height = size
+    base = Image.linear_gradient('L').resize(size).convert('RGB')
+    draw = ImageDraw.Draw(base)
+    for _ in range(12):
+        x, y = rng.randrange(width), rng.randrange(height)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.rectangle([x, y, x + rng.randrange(width // 3 + 1), y + rng.randrange(height // 3 + 1)], fill=color)
+    noise = Image.effect_noise(size, 24).convert('RGB')
+    img = Image.blend(base, noise, 0.15)
+    if mode == 'RGBA':
+        alpha = Image.linear_gradient('L').rotate(rng.randrange(360)).resize(size)
+        img.putalpha(alpha)
+    elif mode == 'P':
+        img = img.quantize(64)
+    elif mode != 'RGB':
+        img = img.convert(mode)
+    return img
+
+def generate_corpus(corpus_dir, files=200, sizes=DEFAULT_SIZES, kinds=DEFAULT_KINDS, seed=0):
+    """生成（或复用）合成语料，返回语料描述；描述相同的已有语料直接复用"""
+    spec = {'files': files, 'sizes': [list(s) for s in sizes], 'kinds': list(kinds), 'seed': seed}
+    spec_path = os.path.join(corpus_dir, 'corpus.json')
+    try:
+        with open(spec_path, 'r', encoding='utf-8') as f:
+            if json.load(f) == spec:
+                return spec
+    except (OSError, ValueError):
+        pass
+
+    shutil.rmtree(corpus_dir, ignore_errors=True)
+    os.makedirs(corpus_dir)
+    rng = random.Random(seed)
+    # 每种类型/尺寸先生成一张模板，再写出多份不同文件名的副本；大语料也能很快生成
+    templates = {}
+    for index in range(files):
+        kind = kinds[index % len(kinds)]
+        size = sizes[(index // len(kinds)) % len(sizes)]
+        key = (kind, size, index % 7)
+        if key not in templates:
+            ext, _, options = CORPUS_KINDS[kind]
+            template_path = os.path.join(corpus_dir, f".template_{len(templates)}{ext}")
+            make_image(kind, size, rng).save(template_path, **options)
+            templates[key] = template_path
+        src = templates[key]
+        shutil.copyfile(src, os.path.join(corpus_dir, f"page_{index + 1}{os.path.splitext(src)[1]}"))
+    for template_path in templates.values():
+        os.remove(template_path)
+
+    with open(spec_path, 'w', encoding='utf-8') as f:
+        json.dump(spec, f)
+    return spec
+
+def _stage(seconds, images, nbytes):
+    return {
+        'seconds': round(seconds, 4),
+        'images_per_sec': round(images / seconds, 1) if seconds else None,
+        'mb_per_sec': round(nbytes / seconds / 1e6, 2) if seconds else None,
+    }
+
+def _engine_stages(image_files, output_pdf_path, engine):
+    """单线程、同步读取跑一遍引擎，按阶段累计它自己的 tracer 事件"""
+    summary = StageSummary()
+    convert_files(image_files, output_pdf_path, engine=engine, workers=1, readers=0, tracer=Tracer(summary),
+                  resume=False, log_callback=lambda message: None)
+    return summary.stages
+
+def measure_stages(corpus_dir, output_pdf_path):
+    """单线程逐张计时各阶段：scan，stream 引擎的 read / passthrough / decode / resize / convert / encode / write，
+    merge 引擎的 merge_load / merge_temp_pdf / merge_append / merge_write
+
+    各阶段取引擎自己的计时事件，每段只计一次（encode 不含解码和颜色转换）。
+    """
+    start = time.perf_counter()
+    entries = scan_folder(corpus_dir, FORMATS)
+    scan_seconds = time.perf_counter() - start
+    image_files = [entry.path for entry in entries]
+    count = len(entries)
+
+    result = {'scan': _stage(scan_seconds, count, 0)}
+    stream = _engine_stages(image_files, output_pdf_path, 'stream')
+    for name in STREAM_STAGES:
+        if name in stream:
+            result[name] = _stage(stream[name]['wall'], count, stream[name]['bytes'])
+    base, ext = os.path.splitext(output_pdf_path)
+    merge = _engine_stages(image_files, f"{base}-merge{ext}", 'merge')
+    for name in MERGE_STAGES:
+        if name in merge:
+            key = name if name.startswith('merge_') else f"merge_{name}"
+            result[key] = _stage(merge[name]['wall'], count, merge[name]['bytes'])
+    return result
+
+def measure_startup(repeat=5, module='image2pdf'):
+    """在新的解释器里用 python -X importtime 导入 module，取 repeat 次中最快的一次
+
+    返回 {'seconds': 导入总耗时, 'modules': 导入的模块数, 'slowest': 自身耗时最多的 5 个模块, 'lazy_loaded': 被提前加载的重依赖}
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                cwd=root, capture_output=True, text=True, encoding='utf-8', check=True)
+        rows = []  # (自身微秒, 累计微秒, 模块名)；子模块缩进，先于导入它的模块输出
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            if name.strip() == module and not name[1:].startswith(' '):
+                rows.append((int(self_us), int(cumulative_us), module))
+                break
+            rows.append((int(self_us), int(cumulative_us), name[1:]))
+        # 只保留 module 及其导入的模块（去掉解释器启动时 site 等导入的部分）
+        start = len(rows) - 1
+        while start > 0 and rows[start - 1][2].startswith(' '):
+            start -= 1
+        rows = [(self_us, cumulative_us, name.strip()) for self_us, cumulative_us, name in rows[start:]]
+        total = rows[-1][1]
+        if best is None or total < best[0]:
+            best = (total, rows)
+    total, rows = best
+    names = {name.split('.')[0] for _, _, name in rows}
+    return {
+        'seconds': round(total / 1e6, 4),
+        'modules': len(rows),
+        'slowest': [[name, round(self_us / 1e3, 1)] for self_us, _, name in sorted(rows, reverse=True)[:5]],
+        'lazy_loaded': [name for name in LAZY_MODULES if name in names],
+    }
+
+def _reset_peak_rss():
+    """Linux：把本进程的峰值 RSS（VmHWM）重置为当前值，成功返回 True
+
+    spawn 出来的子进程会继承父进程的 ru_maxrss，不重置的话峰值里包含了基准进程自己的内存。
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def _peak_rss_mb(since_reset=False):
+    """本进程和已结束的子进程（解码进程池）中最大的峰值 RSS（MB）；since_reset 时读重置后的 VmHWM"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if since_reset:
+        with open('/proc/self/status', 'r') as f:
+            own = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+    else:
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    usage = max(usage, own)
+    # Linux 单位是 KB，macOS 是字节
+    return round(usage / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+def _run_child(queue, image_files, output_pdf_path, engine, workers):
+    """子进程：转换一次，把 ((秒数, 页数, 峰值内存), None) 或 (None, 错误信息) 放进 queue"""
+    try:
+        since_reset = _reset_peak_rss()
+        start = time.perf_counter()
+        pages = convert_files(image_files, output_pdf_path, engine=engine, workers=workers,
+                              log_callback=lambda message: None)
+        if pages is None:
+            raise RuntimeError("转换失败")
+        queue.put(((time.perf_counter() - start, pages, _peak_rss_mb(since_reset)), None))
+    except BaseException as e:
+        queue.put((None, f"{type(e).__name__}: {e}"))
+
+def measure_run(image_files, output_pdf_path, engine='stream', workers=1):
+    """在独立子进程中端到端转换一次，峰值内存只统计这次转换
+
+    子进程出错或异常退出（如导入失败、被杀）时抛出 RuntimeError，不会一直等下去。
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_child, args=(queue, image_files, output_pdf_path, engine, workers))
+    process.start()
+    try:
+        while True:
+            try:
+                result, error = queue.get(timeout=1)
+                break
+            except Empty:
+                if process.is_alive():
+                    continue
+            # 子进程已退出：最后再等一下可能还在管道里的结果
+            try:
+                result, error = queue.get(timeout=1)
+                break
+            except Empty:
+                raise RuntimeError(f"基准子进程（{engine}）异常退出，退出码 {process.exitcode}") from None
+    finally:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+    if error is not None:
+        raise RuntimeError(f"基准子进程（{engine}）出错: {error}")
+    seconds, pages, peak_rss = result
+    input_bytes = sum(os.path.getsize(f) for f in image_files)
+    result = _stage(seconds, len(image_files), input_bytes)
+    result.update({'pages': pages, 'peak_rss_mb': peak_rss, 'output_bytes': os.path.getsize(output_pdf_path)})
+    return result
+
+def run_benchmark(corpus_dir, engines=('stream', 'merge'), workers=(1,), log_callback=print):
+    """对语料跑分阶段计时和各引擎端到端转换，返回结果字典"""
+    work_dir = tempfile.mkdtemp(prefix='image2pdf-bench-')
+    try:
+        log_callback("⏱️ 分阶段计时...")
+        stages = measure_stages(corpus_dir, os.path.join(work_dir, 'stages.pdf'))
+        image_files = [entry.path for entry in scan_folder(corpus_dir, FORMATS)]
+
+        runs = {}
+        for engine in engines:
+            for worker_count in (workers if engine == 'stream' else (1,)):
+                name = f"{engine}-w{worker_count}"
+                log_callback(f"⏱️ 端到端: {name}")
+                runs[name] = measure_run(image_files, os.path.join(work_dir, f"{name}.pdf"), engine, worker_count)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'images': len(image_files),
+        },
+        'stages': stages,
+        'runs': runs,
+    }
+
+def compare_results(old, new, threshold=0.1):
+    """逐项对比耗时，返回 [(名称, 旧秒数, 新秒数, 变化比例, 是否退化)]"""
+    rows = []
+    for section in ('startup', 'stages', 'runs'):
+        for name, new_item in new.get(section, {}).items():
+            old_item = old.get(section, {}).get(name)
+            if not old_item or not old_item.get('seconds') or new_item.get('seconds') is None:
+                continue
+            change = new_item['seconds'] / old_item['seconds'] - 1
+            rows.append((f"{section}.{name}", old_item['seconds'], new_item['seconds'], change, change > threshold))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Image2PDF-Pro 性能基准")
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'image2pdf-bench-corpus'),
+                        help="合成语料目录（描述相同则复用）")
+    parser.add_argument('--files', type=int, default=200, help="语料图片数（默认 200，可到 100000）")
+    parser.add_argument('--sizes', type=parse_sizes, default=DEFAULT_SIZES,
+                        help="分辨率列表，如 800x600,1600x1200")
+    parser.add_argument('--kinds', default=','.join(DEFAULT_KINDS),
+                        help=f"图片类型，逗号分隔（可选 {', '.join(CORPUS_KINDS)}）")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engines', default='stream,merge', help="要测的引擎，逗号分隔")
+    parser.add_argument('--workers', default='1', help="stream 引擎的进程数列表，如 1,4,8")
+    parser.add_argument('--output', help="结果 JSON 写入的文件")
+    parser.add_argument('--compare', help="与之前的结果 JSON 对比")
+    parser.add_argument('--threshold', type=float, default=0.1, help="耗时增加超过该比例视为退化（默认 0.1）")
+    parser.add_argument('--startup-budget', type=float, default=DEFAULT_STARTUP_BUDGET_MS,
+                        help=f"import image2pdf 的耗时预算（毫秒，默认 {DEFAULT_STARTUP_BUDGET_MS}），超出或提前加载了 "
+                             f"{'/'.join(LAZY_MODULES)} 时退出码为 1")
+    parser.add_argument('--startup-only', action='store_true', help="只测启动耗时，不生成语料")
+    args = parser.parse_args(argv)
+
+    kinds = tuple(k.strip() for k in args.kinds.split(','))
+    unknown = [k for k in kinds if k not in CORPUS_KINDS]
+    if unknown:
+        parser.error(f"未知图片类型: {', '.join(unknown)}")
+    unknown = [e for e in args.engines.split(',') if e not in ENGINES]
+    if unknown:
+        parser.error(f"未知引擎: {', '.join(unknown)}（可选 {', '.join(ENGINES)}）")
+
+    print("⏱️ 启动耗时（python -X importtime）...")
+    startup = measure_startup()
+    if args.startup_only:
+        result = {'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                           'platform': platform.platform()},
+                  'stages': {}, 'runs': {}}
+    else:
+        print(f"🧪 准备语料: {args.files} 张 → {args.corpus_dir}")
+        generate_corpus(args.corpus_dir, args.files, args.sizes, kinds, args.seed)
+        try:
+            result = run_benchmark(args.corpus_dir, tuple(args.engines.split(',')),
+                                   tuple(int(w) for w in args.workers.split(',')))
+        except RuntimeError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 1
+        result['meta']['corpus'] = {'files': args.files, 'sizes': [list(s) for s in args.sizes],
+                                    'kinds': list(kinds), 'seed': args.seed}
+    result['startup'] = {'import': startup}
+
+    over_budget = startup['seconds'] * 1000 > args.startup_budget or startup['lazy_loaded']
+    mark = '❌' if over_budget else '✅'
+    print(f"{mark} startup.import      {startup['seconds'] * 1000:>7.1f} 毫秒（预算 {args.startup_budget:g}）"
+          f"  {startup['modules']} 个模块，最慢: "
+          + '，'.join(f"{name} {ms} 毫秒" for name, ms in startup['slowest']))
+    if startup['lazy_loaded']:
+        print(f"❌ 导入时提前加载了: {', '.join(startup['lazy_loaded'])}")
+
+    for section in ('stages', 'runs'):
+        for name, item in result[section].items():
+            extra = ''
+            if 'output_bytes' in item:
+                extra = f"  输出 {item['output_bytes'] / 1e6:.1f} MB  峰值内存 {item['peak_rss_mb']} MB"
+            print(f"{section}.{name:<14} {item['seconds']:>9.3f} 秒  {item['images_per_sec'] or 0:>9.1f} 张/秒{extra}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已写入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+        rows = compare_results(old, result, args.threshold)
+        for name, old_seconds, new_seconds, change, regressed in rows:
+            mark = '❌' if regressed else '✅'
+            print(f"{mark} {name:<20} {old_seconds:.3f} → {new_seconds:.3f} 秒 ({change:+.1%})")
+        if any(row[4] for row in rows):
+            return 1
+    return 1 if over_budget else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
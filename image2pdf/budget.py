@@ -0,0 +1,40 @@
+import re
+import threading
+
+SIZE_UNITS = {'': 1, 'B': 1, 'K': 1 << 10, 'KB': 1 << 10, 'M': 1 << 20, 'MB': 1 << 20,
+              'G': 1 << 30, 'GB': 1 << 30, 'T': 1 << 40, 'TB': 1 << 40}
+
+def parse_size(text):
+    """解析 '2GB'、'512M'、'1.5g' 这样的大小，返回字节数"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([A-Za-z]*)\s*', str(text))
+    if not match or match.group(2).upper() not in SIZE_UNITS:
+        raise ValueError(f"无法识别的大小: {text}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+class Budget:
+    """多个转换任务共享的在途额度（线程安全的计数信号量，内存预算按字节计费）"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, cost=1, blocking=True):
+        """申请额度；非阻塞模式下额度不足立即返回 False
+
+        单个申请超过总额度时，等到额度全部空闲后放行，避免永远等待。
+        """
+        cost = min(cost, self.limit)
+        with self._cond:
+            while self.used + cost > self.limit:
+                if not blocking:
+                    return False
+                self._cond.wait()
+            self.used += cost
+            return True
+
+    def release(self, cost=1):
+        cost = min(cost, self.limit)
+        with self._cond:
+            self.used -= cost
+            self._cond.notify_all()
@@ -0,0 +1,143 @@
+import os
+import json
+import shutil
+import hashlib
+
+# 断点续写：输出先写到 <输出>.part，每完成一批就在 <输出>.part.json 末尾追加一条记录；
+# 重新运行时校验已完成的输入文件没变，就从最后一个完好的批次继续，全部完成后再原子地改名为正式输出。
+# 进度文件是 JSON Lines：第一行是版本和设置，之后每行只含这一批新完成的文件和引擎状态的增量，
+# 每次保存的开销只与这一批有关，不随总页数增长
+# 增量追加直接写在已有的 PDF 末尾（in_place），不复制整个文件；放弃时由写入器截断回原来的长度
+PART_SUFFIX = '.part'
+CHECKPOINT_SUFFIX = '.part.json'
+PARTS_DIR_SUFFIX = '.parts'
+CHECKPOINT_VERSION = 2
+
+def file_key(file_path):
+    """判断输入文件是否变化用的 [文件名, 大小, mtime]"""
+    st = os.stat(file_path)
+    return [os.path.basename(file_path), st.st_size, st.st_mtime_ns]
+
+def tail_key(file_path, end, size=4096):
+    """文件 [end - size, end) 这段字节的哈希：原地追加续写前确认追加起点之前的旧 PDF 没有被替换"""
+    with open(file_path, 'rb') as f:
+        f.seek(max(0, end - size))
+        return hashlib.blake2b(f.read(min(end, size)), digest_size=16).hexdigest()
+
+def merge_state(state, delta):
+    """把一条记录的状态增量合并进 state：列表接在后面，字典逐项更新，其余值直接替换"""
+    for key, value in delta.items():
+        if isinstance(value, list):
+            state.setdefault(key, []).extend(value)
+        elif isinstance(value, dict):
+            state.setdefault(key, {}).update(value)
+        else:
+            state[key] = value
+    return state
+
+def read_checkpoint(state_path):
+    """读取进度文件，返回 (第一行的头, 已完成的文件, 合并后的状态, 最后一条完整记录的结尾偏移)
+
+    中断时写了一半的最后一行会被忽略。
+    """
+    with open(state_path, 'rb') as f:
+        header = json.loads(f.readline())
+        files, state = [], {}
+        end = f.tell()
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            files.extend(record['files'])
+            merge_state(state, record['state'])
+            end += len(line)
+    return header, files, state, end
+
+def pending_append(output_pdf_path):
+    """上次中断的原地追加的起点（追加前旧 PDF 的长度）；没有这样的断点，或起点之前的内容已变时返回 None"""
+    try:
+        _, _, state, _ = read_checkpoint(output_pdf_path + CHECKPOINT_SUFFIX)
+        end = state['append_from']
+        if state.get('base') and tail_key(output_pdf_path, end) == state['base']:
+            return end
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+class Checkpoint:
+    """一个输出 PDF 的续写进度：已完成的输入文件 + 引擎自己的续写状态
+
+    in_place=True 时直接写正式输出（增量追加），完成时不改名，清理时也不删除它。
+    """
+
+    def __init__(self, output_pdf_path, settings, in_place=False):
+        self.output_pdf_path = output_pdf_path
+        self.in_place = in_place
+        self.part_path = output_pdf_path if in_place else output_pdf_path + PART_SUFFIX
+        self.state_path = output_pdf_path + CHECKPOINT_SUFFIX
+        self.parts_dir = output_pdf_path + PARTS_DIR_SUFFIX  # merge 引擎的中间 PDF
+        self.settings = settings
+        self.files = []
+        self.state = None
+        self._started = False  # 进度文件已写好头（或已载入旧进度），之后的保存只追加
+
+    def load(self, image_files):
+        """读取上次的进度，返回可以跳过的输入文件数
+
+        记录的文件必须与 image_files 开头逐个一致（名称、大小、mtime）且设置相同，
+        否则清除旧进度返回 0。image_files 是生成器时不续写。
+        """
+        try:
+            if not hasattr(image_files, '__len__'):
+                raise ValueError
+            header, files, state, end = read_checkpoint(self.state_path)
+            if (header.get('version') != CHECKPOINT_VERSION or header.get('settings') != self.settings
+                    or not files or len(files) > len(image_files)
+                    or not (os.path.exists(self.part_path) or os.path.isdir(self.parts_dir))):
+                raise ValueError
+            for file_path, key in zip(image_files, files):
+                if file_key(file_path) != key:
+                    raise ValueError
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            self.clear()
+            return 0
+        # 去掉写了一半的最后一行，之后的记录接着追加
+        with open(self.state_path, 'r+b') as f:
+            f.truncate(end)
+        self.files = files
+        self.state = state
+        self._started = True
+        return len(files)
+
+    def save(self, files, state):
+        """追加一条记录并落盘：新完成的输入文件 + 自上次保存以来的状态增量（合并规则见 merge_state）"""
+        self.files.extend(files)
+        self.state = merge_state(self.state or {}, state)
+        with open(self.state_path, 'a' if self._started else 'w', encoding='utf-8') as f:
+            if not self._started:
+                f.write(json.dumps({'version': CHECKPOINT_VERSION, 'settings': self.settings},
+                                   ensure_ascii=False) + '\n')
+            f.write(json.dumps({'files': files, 'state': state}, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._started = True
+
+    def commit(self):
+        """全部完成：.part 原子地替换正式输出，再清理进度"""
+        if not self.in_place:
+            os.replace(self.part_path, self.output_pdf_path)
+        self.files = []
+        self.clear()
+
+    def clear(self):
+        """删除 .part、进度文件和中间 PDF 目录（原地追加时不动正式输出）"""
+        paths = (self.state_path,) if self.in_place else (self.part_path, self.state_path)
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.state = None
+        self._started = False
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
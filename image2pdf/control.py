@@ -0,0 +1,46 @@
+import threading
+
+# 协作式取消/暂停：转换线程在每张图片、每批之间调用 checkpoint()，
+# 暂停时在这里等待，取消时抛出 ConversionCancelled，由引擎决定清理还是保留断点
+
+class ConversionCancelled(Exception):
+    """转换被取消"""
+
+class ConversionControl:
+    """界面或调用方用来取消、暂停、继续正在进行的转换（线程安全）"""
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self.keep_partial = True
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def cancel(self, keep_partial=True):
+        """取消转换；keep_partial=True 时已完成的部分保留为断点，下次运行从这里继续，否则删除"""
+        self.keep_partial = keep_partial
+        self._cancelled.set()
+        self._running.set()  # 唤醒暂停中的线程
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def wait(self):
+        """暂停时阻塞到继续或取消"""
+        self._running.wait()
+
+    def checkpoint(self):
+        """检查点：暂停时等待，已取消时抛出 ConversionCancelled"""
+        self._running.wait()
+        if self._cancelled.is_set():
+            raise ConversionCancelled("转换已取消")
@@ -0,0 +1,130 @@
+import os
+
+from .core import DEFAULT_READERS, ENGINES, start_decode_pool
+from .dedup import ImageCache
+from .diskcache import DiskCache
+from .images import DEFAULT_OPTIONS
+from .manifest import MANIFEST_NAME, Manifest
+from .scheduler import JOB_ORDERS, NO_INPUT_ACTIONS, check_outputs, plan_jobs, run_jobs
+from .trace import NULL_TRACER
+
+# 格式名 → 扩展名
+FORMAT_MAP = {
+    'jpg': ['.jpg', '.jpeg'],
+    'jpeg': ['.jpg', '.jpeg'],
+    'png': ['.png'],
+    'webp': ['.webp'],
+    'gif': ['.gif'],
+    'tif': ['.tif', '.tiff'],
+    'tiff': ['.tif', '.tiff'],
+}
+DEFAULT_FORMATS = ['.jpg', '.jpeg', '.png', '.webp']
+
+def parse_formats(text):
+    """解析 'jpg,png' 这样的格式列表，返回扩展名列表"""
+    formats = []
+    for name in text.lower().replace('.', '').split(','):
+        name = name.strip()
+        if name not in FORMAT_MAP:
+            raise ValueError(f"不支持的格式: {name}（可选 {', '.join(FORMAT_MAP)}）")
+        formats.extend(f for f in FORMAT_MAP[name] if f not in formats)
+    return formats
+
+def folder_outputs(folders, output_dir):
+    """每个文件夹输出为 output_dir 下的同名 PDF，返回 (输入文件夹, 输出 PDF) 列表
+
+    不同位置的同名文件夹（如 x/ch1 和 y/ch1）会输出到同一个 PDF，此时抛出 ValueError。
+    """
+    outputs = [(folder, os.path.join(output_dir, f"{os.path.basename(os.path.abspath(folder))}.pdf"))
+               for folder in folders]
+    check_outputs(outputs)
+    return outputs
+
+class Converter:
+    """文件夹 → PDF 转换器：配置一次，可反复调用（命令行、GUI 和其他程序在进程内共用）
+
+    engine / workers / max_jobs / order / batch_size / max_memory / readers / options 含义同 run_jobs；
+    dedup=True 时按内容去重；磁盘缓存默认关闭，cache_size > 0 时才用 cache_dir（默认用户缓存目录）下的
+    磁盘缓存跨运行复用编码结果（命令行默认开启，见 --cache-size）；
+    incremental=True 时用输出目录里的增量清单跳过未变化的文件夹，并从上次的断点继续。
+    去重缓存和解码进程池在多次调用间保留，用完调用 close()（或用 with 语句）。
+    """
+
+    def __init__(self, engine='stream', workers=1, max_jobs=1, order='largest', batch_size=50, max_memory=None,
+                 readers=DEFAULT_READERS, options=DEFAULT_OPTIONS, dedup=True, cache_dir=None,
+                 cache_size=0, incremental=True, tracer=NULL_TRACER,
+                 progress_callback=None, log_callback=print):
+        if engine not in ENGINES:
+            raise ValueError(f"未知引擎: {engine}（可选 {', '.join(ENGINES)}）")
+        if order not in JOB_ORDERS:
+            raise ValueError(f"未知调度顺序: {order}（可选 {', '.join(JOB_ORDERS)}）")
+        self.engine = engine
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.order = order
+        self.batch_size = batch_size
+        self.max_memory = max_memory
+        self.readers = readers
+        self.options = options
+        self.incremental = incremental
+        self.tracer = tracer
+        self.progress_callback = progress_callback
+        self.log_callback = log_callback
+        self.cache = None
+        if dedup:
+            self.cache = ImageCache(disk=DiskCache(cache_dir, cache_size) if cache_size else None)
+        self._executor = None
+
+    def plan(self, folder_outputs, formats=DEFAULT_FORMATS):
+        """为 (输入文件夹, 输出 PDF) 列表建立任务，不转换；不存在或没有图片的文件夹对应 action 为
+        'missing' / 'empty' 的失败任务"""
+        return plan_jobs(folder_outputs, formats, order=self.order, tracer=self.tracer,
+                         log_callback=self.log_callback)
+
+    def run(self, jobs, control=None):
+        """执行 plan() 得到的任务，返回按完成顺序排列的任务列表
+
+        增量清单放在各输出 PDF 所在的目录；control（ConversionControl）可暂停/取消。
+        """
+        if all(job.action in NO_INPUT_ACTIONS for job in jobs):
+            return list(jobs)
+        if self.workers > 1 and self._executor is None:
+            self._executor = start_decode_pool(self.workers)
+        finished = []
+        by_dir = {}
+        for job in jobs:
+            by_dir.setdefault(os.path.dirname(os.path.abspath(job.output_pdf_path)), []).append(job)
+        for output_dir, dir_jobs in by_dir.items():
+            manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME)) if self.incremental else None
+            finished.extend(run_jobs(dir_jobs, max_jobs=self.max_jobs, workers=self.workers, engine=self.engine,
+                                     batch_size=self.batch_size, max_memory=self.max_memory, manifest=manifest,
+                                     options=self.options, readers=self.readers, tracer=self.tracer,
+                                     resume=self.incremental, cache=self.cache, control=control,
+                                     executor=self._executor, progress_callback=self.progress_callback,
+                                     log_callback=self.log_callback))
+        return finished
+
+    def convert(self, folders, output_dir, formats=DEFAULT_FORMATS, control=None):
+        """把每个文件夹转换为 output_dir 下的同名 PDF，返回任务列表（含不存在或没有图片的文件夹）"""
+        os.makedirs(output_dir, exist_ok=True)
+        return self.run(self.plan(folder_outputs(folders, output_dir), formats), control)
+
+    def convert_folder(self, input_folder, output_pdf_path, formats=DEFAULT_FORMATS, control=None):
+        """转换单个文件夹，返回任务（FolderJob，success/pages/output_bytes 为结果）；文件夹不存在或没有图片时返回 None"""
+        jobs = self.plan([(input_folder, output_pdf_path)], formats)
+        if jobs[0].action in NO_INPUT_ACTIONS:
+            return None
+        os.makedirs(os.path.dirname(os.path.abspath(output_pdf_path)), exist_ok=True)
+        return self.run(jobs, control)[0]
+
+    def close(self):
+        """关闭解码进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,567 @@
+import os
+import sys
+import time
+import signal
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import groupby
+from PIL import Image
+
+from .budget import Budget
+from .checkpoint import Checkpoint, file_key, tail_key
+from .control import ConversionCancelled
+from .dedup import content_hash, reserve_cache_memory
+from .images import (DEFAULT_OPTIONS, read_jpeg_info, read_input, input_file, jpeg_to_pdf_image,
+                     passthrough_image, decode_pdf_image, estimate_memory, has_alpha, flatten, frame_count,
+                     iter_frame_images, jpeg_params)
+from .pdfwriter import PdfImage, PdfStreamWriter
+from .scan import iter_image_entries, scan_folder
+from .trace import NULL_TRACER, Tracer
+
+# stream：单遍流式写入（默认）；merge：旧版中间 PDF + PdfMerger 合并
+ENGINES = ('stream', 'merge')
+# 预读线程数：读盘与解码/编码重叠；0 表示在解码前同步读取
+DEFAULT_READERS = 2
+
+# tqdm、PyPDF2 只在用到时才导入：服务里反复调用、GUI 和 stream 引擎都不必为它们付启动开销
+
+class NullProgress:
+    """不显示的进度条（与 tqdm 的用法相同）"""
+
+    def update(self, n=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+def progress_bar(total, initial=0):
+    """标准错误是终端时显示 tqdm 进度条；无终端（服务、GUI、输出重定向到文件）时不加载 tqdm"""
+    if sys.stderr is None or not sys.stderr.isatty():
+        return NullProgress()
+    from tqdm import tqdm
+    return tqdm(total=total, initial=initial, desc="🖼️ 加载图片", unit="img")
+
+def list_image_files(input_folder, formats):
+    """列出文件夹中指定格式的图片，按自然顺序排序"""
+    return [entry.path for entry in scan_folder(input_folder, formats)]
+
+def iter_image_files(input_folder, formats):
+    """按目录顺序逐个产出图片路径（不排序），可在目录列完之前开始转换"""
+    for entry in iter_image_entries(input_folder, formats):
+        yield entry.path
+
+def convert_images_to_pdf(images, output_pdf_path, log_callback=print, options=DEFAULT_OPTIONS):
+    """将一批图像转换为 PDF；透明图合成到 options.background（默认白色），不再变成黑底，
+    JPEG 质量等参数同 stream 引擎"""
+    if not images:
+        return False
+
+    def to_rgb(img):
+        return flatten(img, options.background or 'white') if has_alpha(img) else img.convert('RGB')
+
+    try:
+        to_rgb(images[0]).save(
+            output_pdf_path,
+            save_all=True,
+            append_images=[to_rgb(img) for img in images[1:]],
+            resolution=100.0,
+            **jpeg_params(options)
+        )
+        return True
+    except Exception as e:
+        log_callback(f"❌ 生成中间 PDF 失败: {output_pdf_path} - {str(e)}")
+        return False
+
+def convert_jpegs_to_pdf(jpeg_files, output_pdf_path, log_callback=print):
+    """JPEG 直通：原始字节作为 DCTDecode 图像直接写入 PDF"""
+    if not jpeg_files:
+        return False
+
+    try:
+        with PdfStreamWriter(output_pdf_path) as writer:
+            for file_path, info in jpeg_files:
+                writer.add_image_page(jpeg_to_pdf_image(read_input(file_path), info))
+        return True
+    except Exception as e:
+        log_callback(f"❌ 生成中间 PDF 失败: {output_pdf_path} - {str(e)}")
+        return False
+
+def init_worker():
+    """解码进程忽略 Ctrl-C，由主进程统一取消并保存断点（否则在途图片会被当成加载失败）"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def start_decode_pool(workers):
+    """创建解码进程池，并在当前（主）线程里先把子进程拉起来
+
+    进程池在第一次 submit 时才 fork；若由读线程触发，别的读线程可能正持有导入锁（PIL 按需加载插件），
+    子进程继承到被占用的锁会永远卡住。
+    """
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+    executor.submit(int).result()
+    return executor
+
+def decode_in_worker(source, options=DEFAULT_OPTIONS, name=None, traced=False):
+    """进程池任务：source 为原始字节或文件路径（mmap 不能跨进程传递，由子进程自己映射）
+
+    traced 时返回 (PdfImage, 事件列表)，由主进程交给 tracer。
+    """
+    if isinstance(source, str):
+        source = read_input(source)
+    if not traced:
+        return decode_pdf_image(source, options, NULL_TRACER, name)
+    events = []
+    image = decode_pdf_image(source, options, Tracer(events.append), name)
+    return image, events
+
+def prefetch_pdf_image(file_path, executor=None, options=DEFAULT_OPTIONS, tracer=NULL_TRACER, cache=None):
+    """读线程：读入原始字节，能直通就地生成 PdfImage，否则提交给解码进程池并返回 Future
+    （没有进程池时返回原始字节，由取结果的线程解码）
+
+    返回 (内容哈希, 结果)；传入 cache（ImageCache）时先算内容哈希，已编码过的图片直接取缓存。
+    多帧图片返回逐帧编码的生成器，由取结果的线程边迭代边解码。
+    """
+    name = os.path.basename(file_path)
+    with tracer.span('read', file=name) as record:
+        data = read_input(file_path)
+        record['bytes'] = len(data)
+    key = None
+    if cache is not None:
+        with tracer.span('hash', file=name) as record:
+            key = content_hash(data)
+            record['bytes'] = len(data)
+        with tracer.span('cache', file=name) as record:
+            image = cache.get(key, options)
+            record['hit'] = image is not None
+        if image is not None:
+            return key, image
+    if options.frames and frame_count(data) > 1:
+        return None, iter_frame_images(data, options, tracer, name, key)
+    image = passthrough_image(data, tracer, name, options)
+    if image is not None:
+        image.key = key
+        return key, image
+    if executor is None:
+        return key, data
+    source = data if isinstance(data, bytes) else file_path
+    return key, executor.submit(decode_in_worker, source, options, name, tracer.enabled)
+
+def finish_pdf_image(key, result, file_path, options=DEFAULT_OPTIONS, tracer=NULL_TRACER, cache=None):
+    """取出预取结果：等待解码进程，或在当前线程解码原始字节；新编码的图片记入 cache
+
+    多帧图片原样返回逐帧的生成器。
+    """
+    if isinstance(result, Iterator):
+        return result
+    if isinstance(result, Future):
+        result = result.result()
+        if tracer.enabled:
+            result, events = result
+            for event in events:
+                tracer.emit(event)
+    elif not isinstance(result, PdfImage):  # 原始字节或 mmap，在当前线程解码
+        result = decode_pdf_image(result, options, tracer, os.path.basename(file_path))
+    if key is not None and result.key is None:
+        result.key = key
+        with tracer.span('cache_put', file=os.path.basename(file_path)) as record:
+            cache.put(key, options, result)
+            record['bytes'] = result.length
+    return result
+
+def estimate_cost(file_path, entries=None, options=DEFAULT_OPTIONS):
+    """估算一张图片的内存；entries（路径 → ImageEntry）里有的直接用扫描时缓存的文件大小和图片头"""
+    entry = entries.get(file_path) if entries else None
+    if entry is None:
+        return estimate_memory(file_path, options=options)
+    try:
+        return estimate_memory(file_path, entry.header, options, entry.size)
+    except Exception:
+        return estimate_memory(file_path, options=options)
+
+def iter_pdf_images(image_files, workers=1, executor=None, budget=None, tracer=NULL_TRACER,
+                    options=DEFAULT_OPTIONS, readers=DEFAULT_READERS, cache=None, entries=None):
+    """按原顺序逐张产出 (文件路径, PdfImage 或加载异常)；多帧图片产出逐帧的生成器（元素同样是 PdfImage 或异常）
+
+    三段流水线：readers 个读线程预取原始字节（可直通的 JPEG/PNG 在读线程里直接完成），
+    需要解码的图片交给进程池（workers > 1 或传入共享 executor），否则在当前线程解码；
+    结果按输入顺序交给写入器，读盘和解码/编码同时进行。
+    传入 budget（字节）时，每张图片按文件头估算的内存占用申请额度，
+    额度不足就少预取，保证峰值内存不超过预算。
+    传入 cache（ImageCache）时图片带上内容哈希，重复的图片只编码一次。
+    entries（路径 → ImageEntry）为扫描结果时，估算直接用扫描时读好的图片头，不再重复读文件头。
+    """
+    if executor is None and workers <= 1 and readers <= 0:
+        for file_path in image_files:
+            cost = estimate_cost(file_path, entries, options) if budget is not None else 0
+            if budget is not None:
+                budget.acquire(cost)
+            try:
+                key, result = prefetch_pdf_image(file_path, None, options, tracer, cache)
+                result = finish_pdf_image(key, result, file_path, options, tracer, cache)
+            except Exception as e:
+                result = e
+            finally:
+                if budget is not None:
+                    budget.release(cost)
+            yield file_path, result
+        return
+
+    readers = max(readers, 1)
+    # 读线程多预取几张，解码进程忙时磁盘也不闲着
+    read_ahead = max(workers, 1) * 2 + readers
+    with ThreadPoolExecutor(max_workers=readers, thread_name_prefix='image2pdf-read') as read_pool:
+        if executor is None and workers > 1:
+            with start_decode_pool(workers) as executor:
+                yield from _iter_pipeline(image_files, read_pool, executor, read_ahead, budget, tracer,
+                                          options, cache, entries)
+        else:
+            yield from _iter_pipeline(image_files, read_pool, executor, read_ahead, budget, tracer, options, cache,
+                                      entries)
+
+def _iter_pipeline(image_files, read_pool, executor, read_ahead, budget, tracer=NULL_TRACER,
+                   options=DEFAULT_OPTIONS, cache=None, entries=None):
+    """读线程预取、进程池（或当前线程）解码；有共享 budget 时每张在途图片占用其估算内存的额度"""
+    files = iter(image_files)
+    pending = deque()
+    waiting = None  # 已估算、还没拿到额度的下一张 (文件路径, 估算字节)
+
+    def submit_more():
+        nonlocal waiting
+        while len(pending) < read_ahead:
+            if waiting is None:
+                file_path = next(files, None)
+                if file_path is None:
+                    return
+                waiting = (file_path, estimate_cost(file_path, entries, options) if budget is not None else 0)
+            file_path, cost = waiting
+            # 手里没有在途任务时才阻塞等待额度，否则多个任务互相占着额度会死锁
+            if budget is not None and not budget.acquire(cost, blocking=not pending):
+                return
+            waiting = None
+            pending.append((file_path, cost,
+                            read_pool.submit(prefetch_pdf_image, file_path, executor, options, tracer, cache)))
+
+    try:
+        submit_more()
+        while pending:
+            file_path, cost, future = pending.popleft()
+            try:
+                key, result = future.result()
+                result = finish_pdf_image(key, result, file_path, options, tracer, cache)
+            except Exception as e:
+                result = e
+            if budget is not None:
+                budget.release(cost)
+            submit_more()
+            yield file_path, result
+    finally:
+        # 提前结束（出错或取消）时归还仍在途图片的额度
+        if budget is not None:
+            for _, cost, future in pending:
+                future.cancel()
+                budget.release(cost)
+
+def iter_batches(image_files, batch_size=50, max_memory=None, entries=None):
+    """按张数和估算内存切分批次：满 batch_size 张或超出 max_memory 字节即开始新的一批
+
+    entries（路径 → ImageEntry）同 iter_pdf_images，用扫描时读好的图片头估算。
+    """
+    batch, batch_cost = [], 0
+    for file_path in image_files:
+        cost = estimate_cost(file_path, entries) if max_memory else 0
+        if batch and (len(batch) >= batch_size or (max_memory and batch_cost + cost > max_memory)):
+            yield batch, batch_cost
+            batch, batch_cost = [], 0
+        batch.append(file_path)
+        batch_cost += cost
+    if batch:
+        yield batch, batch_cost
+
+def process_folder(input_folder, output_pdf_path, formats, batch_size=50, engine='stream',
+                   workers=1, max_memory=None, options=DEFAULT_OPTIONS, readers=DEFAULT_READERS,
+                   tracer=NULL_TRACER, cache=None, control=None, progress_callback=None, log_callback=print):
+    """将文件夹内的图片转换为一个 PDF，成功返回 True
+
+    workers 仅对 stream 引擎生效；readers 为预读线程数；max_memory 为内存预算（字节，去重缓存和在途图片共用）；
+    options 为 ImageOptions 编码选项；tracer 接收各阶段的计时事件；
+    cache 为 ImageCache 时重复的图片只编码一次、共用一个图像对象；
+    control 为 ConversionControl 时可以暂停/取消（取消时抛出 ConversionCancelled）。
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"未知引擎: {engine}（可选 {', '.join(ENGINES)}）")
+
+    try:
+        with tracer.span('list', folder=input_folder) as record:
+            image_files = list_image_files(input_folder, formats)
+            record['files'] = len(image_files)
+
+        if not image_files:
+            log_callback(f"⏭️ 无 {formats} 文件: {input_folder}")
+            return False
+
+    except Exception as e:
+        log_callback(f"❌ 发生严重错误: {str(e)}")
+        return False
+
+    max_memory = reserve_cache_memory(cache, max_memory)
+    budget = Budget(max_memory) if max_memory else None
+    pages = convert_files(image_files, output_pdf_path, batch_size, engine, workers, budget=budget,
+                          options=options, readers=readers, tracer=tracer, cache=cache, control=control,
+                          progress_callback=progress_callback, log_callback=log_callback)
+    return pages is not None
+
+def convert_files(image_files, output_pdf_path, batch_size=50, engine='stream', workers=1,
+                  executor=None, budget=None, append=False, options=DEFAULT_OPTIONS, readers=DEFAULT_READERS,
+                  tracer=NULL_TRACER, resume=True, cache=None, control=None, progress_callback=None,
+                  log_callback=print, entries=None, hashes=None):
+    """将已排好序的图片列表（或边扫描边产出的生成器）转换为一个 PDF
+
+    成功返回输出 PDF 的总页数，失败返回 None。
+
+    executor/budget/cache 由调度器传入，多个文件夹共享同一个进程池、内存预算和去重缓存；
+    append=True 时把图片作为新页面增量追加到已有的 PDF（仅 stream 引擎）；
+    每 batch_size 张记录一次断点，resume=True 时从上次中断的断点继续。
+    control（ConversionControl）在每张图片、每批之间检查暂停/取消，取消时抛出 ConversionCancelled。
+    entries（路径 → ImageEntry）为扫描结果时，内存估算直接用扫描时缓存的文件大小和图片头。
+    hashes 为 dict 时记下去重时算过的内容哈希（路径 → 哈希，仅 stream 引擎），增量清单不必再读一遍文件。
+    """
+    try:
+        if append:
+            log_callback(f"📎 追加 {len(image_files)} 张新图片")
+        elif hasattr(image_files, '__len__'):
+            log_callback(f"📊 总计需处理: {len(image_files)} 张图片")
+
+        if engine == 'merge':
+            image_files = list(image_files)
+            return merge_folder(image_files, output_pdf_path, batch_size, progress_callback, log_callback,
+                                budget=budget, options=options, readers=readers, tracer=tracer, resume=resume,
+                                control=control, entries=entries)
+        return stream_folder(image_files, output_pdf_path, workers, progress_callback, log_callback,
+                             executor=executor, budget=budget, append=append, options=options,
+                             readers=readers, tracer=tracer, checkpoint_every=batch_size, resume=resume,
+                             cache=cache, control=control, entries=entries, hashes=hashes)
+
+    except ConversionCancelled:
+        raise
+    except Exception as e:
+        log_callback(f"❌ 发生严重错误: {str(e)}")
+        return None
+
+def stream_folder(image_files, output_pdf_path, workers=1, progress_callback=None, log_callback=print,
+                  executor=None, budget=None, append=False, options=DEFAULT_OPTIONS, readers=DEFAULT_READERS,
+                  tracer=NULL_TRACER, checkpoint_every=50, resume=True, cache=None, control=None, entries=None,
+                  hashes=None):
+    """单遍流式写入：每张图片编码后立即作为页面追加到 PDF
+
+    先写 <输出>.part，每 checkpoint_every 张记录一次断点；中断后重新运行（resume=True）
+    从最后一个断点继续，全部完成后原子地改名为正式输出。
+    传入 cache 时内容相同的图片只写一个图像 XObject，多个页面共用。
+    control 取消时按 control.keep_partial 把已写完的图片记入断点，或删除未完成的输出。
+    image_files 可以是生成器（总数未知时不报告百分比进度，也不续写）。返回 PDF 总页数。
+    """
+    total_files = len(image_files) if hasattr(image_files, '__len__') else None
+    start_time = time.time()
+
+    # 增量追加直接写在旧输出末尾，不复制整个文件；续写前确认追加起点之前的内容仍是原来那个 PDF
+    checkpoint = Checkpoint(output_pdf_path, {'engine': 'stream', 'append': append, **options._asdict()},
+                            in_place=append)
+    done = checkpoint.load(image_files) if resume else 0
+    if done and append:
+        state = checkpoint.state
+        try:
+            valid = (os.path.getsize(output_pdf_path) >= state['position']
+                     and tail_key(output_pdf_path, state['append_from']) == state.get('base'))
+        except (OSError, KeyError, TypeError):
+            valid = False
+        if not valid:
+            done = 0
+    base = None
+    if done:
+        writer = PdfStreamWriter.resume(checkpoint.part_path, checkpoint.state)
+        base = checkpoint.state.get('base')
+        image_files = image_files[done:]
+        log_callback(f"♻️ 从断点继续：跳过已完成的 {done} 张")
+    else:
+        checkpoint.clear()
+        if append:
+            base = tail_key(output_pdf_path, os.path.getsize(output_pdf_path))
+        writer = PdfStreamWriter(checkpoint.part_path, append=append)
+
+    covered = []  # 上个断点之后处理过的输入文件
+    try:
+        with progress_bar(total_files, done) as pbar:
+            images = iter_pdf_images(image_files, workers, executor, budget, tracer, options, readers, cache,
+                                     entries)
+            for index, (file_path, image) in enumerate(images, done + 1):
+                if control is not None:
+                    control.checkpoint()
+                if hashes is not None and isinstance(image, PdfImage) and image.key is not None:
+                    hashes[file_path] = image.key  # 开启去重时 key 就是文件内容哈希
+                # 多帧图片在这里逐帧解码，每帧一页（暂停在帧之间生效，取消等到整张图片写完）
+                for image in (image if isinstance(image, Iterator) else (image,)):
+                    if control is not None:
+                        control.wait()
+                    if isinstance(image, Exception):
+                        log_callback(f"\n⚠️ 加载失败: {os.path.basename(file_path)} - {str(image)}")
+                        continue
+                    with tracer.span('write', file=os.path.basename(file_path)) as record:
+                        start = writer.bytes_written
+                        writer.add_image_page(image)
+                        record['bytes'] = writer.bytes_written - start
+                covered.append(file_key(file_path))
+                if total_files is not None and len(covered) >= checkpoint_every:
+                    with tracer.span('checkpoint'):
+                        checkpoint.save(covered, {**writer.checkpoint(), 'base': base})
+                    covered = []
+                pbar.update(1)
+                if progress_callback and total_files:
+                    progress_callback(index / total_files * 100)
+
+        with tracer.span('finalize') as record:
+            start = writer.bytes_written
+            writer.close()
+            checkpoint.commit()
+            record['bytes'] = os.path.getsize(output_pdf_path) - start
+    except BaseException as e:
+        keep = not isinstance(e, ConversionCancelled) or control.keep_partial
+        if isinstance(e, ConversionCancelled) and keep and covered and total_files is not None:
+            # 取消发生在图片之间，已写完的图片都能续写
+            checkpoint.save(covered, {**writer.checkpoint(), 'base': base})
+        if keep and checkpoint.files:
+            writer.detach()
+            log_callback(f"\n💾 已保存断点（{len(checkpoint.files)} 张），重新运行即可继续")
+        else:
+            writer.abort()
+            checkpoint.clear()
+        raise
+
+    if writer.shared_images:
+        log_callback(f"♻️ {writer.shared_images} 页是重复图片，共用已写入的图像")
+    log_callback(f"✅ 写入完成！共 {writer.page_count} 页，耗时 {time.time()-start_time:.1f} 秒")
+    return writer.page_count
+
+def merge_folder(image_files, output_pdf_path, batch_size=50, progress_callback=None, log_callback=print,
+                 budget=None, options=DEFAULT_OPTIONS, readers=DEFAULT_READERS, tracer=NULL_TRACER, resume=True,
+                 control=None, entries=None):
+    """旧版引擎：每批生成中间 PDF，再用 PdfMerger 合并
+
+    有 budget 时每批的估算内存不超过预算，加载前先申请整批额度；
+    同一批内由 readers 个线程预读原始字节，解码时磁盘继续读后面的文件。
+    中间 PDF 保存在 <输出>.parts 目录并逐批记录断点，中断后重新运行（resume=True）复用已完成的批次；
+    合并结果先写 <输出>.part 再原子地改名。control 在每张图片、每批之间检查暂停/取消。返回 PDF 总页数。
+    """
+    if options.max_dpi or options.max_size:
+        log_callback("⚠️ merge 引擎不支持缩小分辨率（max_dpi / max_size），已忽略")
+    total_files = len(image_files)
+    checkpoint = Checkpoint(output_pdf_path, {'engine': 'merge', 'background': options.background,
+                                              **jpeg_params(options)})
+    temp_dir = checkpoint.parts_dir
+    done_files = checkpoint.load(image_files) if resume else 0
+    batches = checkpoint.state['batches'] if done_files else []  # 已完成的中间 PDF 文件名
+    if not all(os.path.exists(os.path.join(temp_dir, name)) for name in batches):
+        done_files, batches = 0, []
+    if not done_files:
+        checkpoint.clear()
+    os.makedirs(temp_dir, exist_ok=True)
+    from PyPDF2 import PdfMerger
+    merger = PdfMerger()
+    read_pool = ThreadPoolExecutor(max_workers=max(readers, 1), thread_name_prefix='image2pdf-read')
+    try:
+        if done_files:
+            log_callback(f"♻️ 从断点继续：复用 {len(batches)} 个中间 PDF，跳过已完成的 {done_files} 张")
+            for name in batches:
+                with open(os.path.join(temp_dir, name), 'rb') as f:
+                    merger.append(f)
+        batch_count = len(batches)
+
+        with progress_bar(total_files, done_files) as pbar:
+            max_memory = budget.limit if budget is not None else None
+            for batch_files, batch_cost in iter_batches(image_files[done_files:], batch_size, max_memory,
+                                                        entries):
+                if control is not None:
+                    control.checkpoint()
+                if budget is not None:
+                    budget.acquire(batch_cost)
+                batch = [(file_path, read_jpeg_info(file_path)) for file_path in batch_files]
+
+                try:
+                    # 连续的 JPEG 走直通路径，其余图片仍由 Pillow 转换
+                    for is_jpeg, group in groupby(batch, key=lambda item: item[1] is not None):
+                        group = list(group)
+                        temp_pdf = os.path.join(temp_dir, f"temp_{batch_count}.pdf")
+
+                        if is_jpeg:
+                            with tracer.span('passthrough', files=len(group)):
+                                success = convert_jpegs_to_pdf(group, temp_pdf, log_callback)
+                            pbar.update(len(group))
+                        else:
+                            images = []
+                            reads = [read_pool.submit(read_input, file_path) for file_path, _ in group]
+                            for (file_path, _), read in zip(group, reads):
+                                if control is not None:
+                                    control.checkpoint()
+                                try:
+                                    with tracer.span('load', file=os.path.basename(file_path)) as record:
+                                        data = read.result()
+                                        img = Image.open(input_file(data))
+                                        img.load()
+                                        images.append(img)
+                                        record['bytes'] = len(data)
+                                    if options.frames and getattr(img, 'n_frames', 1) > 1:
+                                        log_callback(f"\n⚠️ merge 引擎只转换第一帧: {os.path.basename(file_path)}")
+                                except Exception as e:
+                                    log_callback(f"\n⚠️ 加载失败: {os.path.basename(file_path)} - {str(e)}")
+                                pbar.update(1)
+
+                            with tracer.span('temp_pdf', files=len(images)):
+                                success = convert_images_to_pdf(images, temp_pdf, log_callback, options)
+                            for img in images:
+                                img.close()
+
+                        done_files += len(group)
+                        if progress_callback:
+                            progress_callback(done_files / total_files * 100)
+
+                        if success:
+                            with tracer.span('merge_append') as record, open(temp_pdf, 'rb') as f:
+                                merger.append(f)
+                                record['bytes'] = os.path.getsize(temp_pdf)
+                            batch_count += 1
+                            batches.append(os.path.basename(temp_pdf))
+                            log_callback(f"\n🔖 已生成第 {batch_count} 个中间 PDF（本批 {len(group)} 张）")
+                        with tracer.span('checkpoint'):
+                            # 只记录本批新增的中间 PDF（失败的批次没有）
+                            checkpoint.save([file_key(file_path) for file_path, _ in group],
+                                            {'batches': batches[-1:] if success else []})
+                finally:
+                    if budget is not None:
+                        budget.release(batch_cost)
+
+        log_callback(f"\n📂 开始合并 {batch_count} 个中间 PDF...")
+        start_time = time.time()
+        with tracer.span('merge_write') as record:
+            with open(checkpoint.part_path, 'wb') as f:
+                merger.write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            record['bytes'] = os.path.getsize(checkpoint.part_path)
+        pages = len(merger.pages)
+        merger.close()
+        checkpoint.commit()
+        log_callback(f"✅ 合并完成！耗时 {time.time()-start_time:.1f} 秒")
+        return pages
+
+    except BaseException as e:
+        keep = not isinstance(e, ConversionCancelled) or control.keep_partial
+        if keep and checkpoint.files:
+            log_callback(f"\n💾 已保存断点（{len(checkpoint.files)} 张），重新运行即可继续")
+        else:
+            checkpoint.clear()
+        raise
+
+    finally:
+        read_pool.shutdown(cancel_futures=True)
+        merger.close()
@@ -0,0 +1,84 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+# 内容去重：按文件内容哈希识别重复图片（横幅、空白页、各卷共用的封面……）
+# 同一个 PDF 内重复的图片只写一个图像 XObject，多个页面引用它；
+# 同一次运行中已编码过的图片留在内存缓存里，其他页面或文件夹再遇到时不再解码/编码；
+# 可再接一个 DiskCache，跨运行复用编码结果
+DEFAULT_CACHE_SIZE = 256 << 20
+# 设了内存预算时，内存缓存最多占预算的 1/CACHE_MEMORY_SHARE，其余留给在途图片
+CACHE_MEMORY_SHARE = 4
+
+def content_hash(data):
+    """文件内容哈希（blake2b-128，十六进制）；data 可以是 bytes 或 mmap"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def reserve_cache_memory(cache, max_memory):
+    """把内存缓存计入内存预算：缓存上限压到预算的 1/CACHE_MEMORY_SHARE 以内，返回留给在途图片的预算
+
+    没有预算或没有缓存时原样返回 max_memory。
+    """
+    if not max_memory or cache is None:
+        return max_memory
+    cache.shrink(max_memory // CACHE_MEMORY_SHARE)
+    return max_memory - cache.max_bytes
+
+class ImageCache:
+    """已编码图像的内存缓存：(内容哈希, 编码选项) -> PdfImage，超过 max_bytes 时淘汰最久未用的
+
+    传入 disk（DiskCache）时内存未命中再查磁盘，新编码的图片同时写入磁盘。
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_SIZE, disk=None):
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self.hits = 0
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(image):
+        return image.length + (image.smask.length if image.smask is not None else 0)
+
+    def get(self, key, options):
+        with self._lock:
+            image = self._items.get((key, options))
+            if image is not None:
+                self._items.move_to_end((key, options))
+                self.hits += 1
+                return image
+        if self.disk is not None:
+            image = self.disk.get(key, options)
+            if image is not None:
+                self._remember(key, options, image)
+        return image
+
+    def put(self, key, options, image):
+        """记入新编码的图片"""
+        self._remember(key, options, image)
+        if self.disk is not None:
+            self.disk.put(key, options, image)
+
+    def shrink(self, max_bytes):
+        """把上限降到 max_bytes（不会调高），超出的部分立即淘汰"""
+        with self._lock:
+            self.max_bytes = min(self.max_bytes, max_bytes)
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes:
+            _, old = self._items.popitem(last=False)
+            self._bytes -= self._size(old)
+
+    def _remember(self, key, options, image):
+        size = self._size(image)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if (key, options) in self._items:
+                return
+            self._items[key, options] = image
+            self._bytes += size
+            self._evict()
@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import hashlib
+import threading
+
+from .images import read_input
+from .pdfwriter import PdfImage
+
+# 磁盘缓存：把重新编码过的图像 XObject（数据 + 描述参数）按 内容哈希 + 编码选项 存到本地目录，
+# 跨运行复用；再次生成时命中的图片直接读出编码好的字节写入 PDF，不再解码/编码。
+# 每个条目一个文件：一行 JSON 头 + 蒙版数据 + 图像数据；总大小超过上限时按最近使用时间淘汰
+DISK_CACHE_VERSION = 1
+DEFAULT_DISK_CACHE_SIZE = 1 << 30
+ENTRY_SUFFIX = '.xobj'
+
+def default_cache_dir():
+    """按系统习惯的用户缓存目录（Windows 为 %LOCALAPPDATA%，其余为 $XDG_CACHE_HOME 或 ~/.cache）"""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'image2pdf')
+
+def _describe(image):
+    return {
+        'width': image.width, 'height': image.height,
+        'colorspace': image.colorspace.decode('latin-1'), 'bits': image.bits,
+        'filter': image.filter.decode('latin-1') if image.filter else None,
+        'decode': image.decode,
+        'decode_parms': image.decode_parms.decode('latin-1') if image.decode_parms else None,
+        'dpi': image.dpi, 'length': image.length,
+    }
+
+def _restore(meta, data):
+    dpi = meta['dpi']
+    return PdfImage(data, meta['width'], meta['height'], meta['colorspace'].encode('latin-1'), meta['bits'],
+                    meta['filter'].encode('latin-1') if meta['filter'] else None, meta['decode'],
+                    meta['decode_parms'].encode('latin-1') if meta['decode_parms'] else None,
+                    dpi=tuple(dpi) if isinstance(dpi, list) else dpi)
+
+class DiskCache:
+    """目录中的已编码图像缓存，总大小不超过 max_bytes（按修改时间近似 LRU，命中时刷新）
+
+    多个进程同时使用同一目录是安全的：条目先写临时文件再原子改名，读到不完整的条目按未命中处理。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_DISK_CACHE_SIZE):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._bytes = sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        """(路径, mtime, 大小) 列表"""
+        entries = []
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(ENTRY_SUFFIX):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((entry.path, st.st_mtime, st.st_size))
+        return entries
+
+    def _path(self, key, options):
+        settings = json.dumps({'version': DISK_CACHE_VERSION, 'key': key, **options._asdict()}, sort_keys=True)
+        name = hashlib.blake2b(settings.encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, name[:2], name + ENTRY_SUFFIX)
+
+    def get(self, key, options):
+        """返回缓存的 PdfImage（数据是对缓存文件内容的切片，不复制），未命中返回 None"""
+        path = self._path(key, options)
+        try:
+            data = read_input(path)
+            end = data.find(b'\n')
+            if end < 0:
+                raise ValueError("缓存条目不完整")
+            header = json.loads(bytes(data[:end]))
+            mask_meta, image_meta = header['smask'], header['image']
+            mask_length = mask_meta['length'] if mask_meta else 0
+            if end + 1 + mask_length + image_meta['length'] != len(data):
+                raise ValueError("缓存条目不完整")
+            os.utime(path)  # 刷新最近使用时间
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError):
+            self._remove(path)
+            return None
+        view = memoryview(data)
+        start = end + 1
+        image = _restore(image_meta, view[start + mask_length:])
+        if mask_meta:
+            image.smask = _restore(mask_meta, view[start:start + mask_length])
+        image.key = key
+        with self._lock:
+            self.hits += 1
+        return image
+
+    def put(self, key, options, image):
+        """写入一个条目；写失败（磁盘满、无权限）时静默放弃，缓存只是加速"""
+        path = self._path(key, options)
+        header = {'smask': _describe(image.smask) if image.smask is not None else None,
+                  'image': _describe(image)}
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                f.write(json.dumps(header).encode('utf-8') + b'\n')
+                if image.smask is not None:
+                    f.writelines(image.smask.segments)
+                f.writelines(image.segments)
+                size = f.tell()
+            os.replace(temp_path, path)
+        except OSError:
+            self._remove(temp_path)
+            return
+        with self._lock:
+            self._bytes += size
+            if self._bytes <= self.max_bytes:
+                return
+        self.evict()
+
+    def evict(self):
+        """删除最久未用的条目，直到总大小降到上限的 90% 以下"""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[1])
+            total = sum(size for _, _, size in entries)
+            for path, _, size in entries:
+                if total <= self.max_bytes * 0.9:
+                    break
+                if self._remove(path):
+                    total -= size
+            self._bytes = total
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
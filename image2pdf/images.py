@@ -0,0 +1,457 @@
+import io
+import os
+import mmap
+import struct
+from collections import namedtuple
+from PIL import Image, ImageColor, ImageSequence
+
+from .pdfwriter import DEFAULT_RESOLUTION, PdfImage
+from .trace import NULL_TRACER
+
+# SOF 标记（排除 DHT/JPG/DAC）
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# PDF 的 DCTDecode 只保证支持 8 位精度的基线、扩展顺序和渐进式（霍夫曼编码）JPEG；
+# 无损、分层、算术编码或 12 位的 JPEG 不能直通，交给 Pillow 解码
+JPEG_PASSTHROUGH_MARKERS = {0xC0, 0xC1, 0xC2}
+
+JPEG_COLORSPACES = {1: b'/DeviceGray', 3: b'/DeviceRGB', 4: b'/DeviceCMYK'}
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# 可直通的 PNG 颜色类型 -> (PDF 颜色空间, 每像素分量数)；带 alpha 的类型 4/6 不能直通
+PNG_COLORSPACES = {0: (b'/DeviceGray', 1), 2: (b'/DeviceRGB', 3), 3: (b'/Indexed', 1)}
+
+# 不小于该大小的输入文件用只读 mmap 读取：直通时压缩数据零拷贝写入 PDF，解码时不在堆上多留一份原始字节
+MMAP_THRESHOLD = 4 << 20
+
+# 带 alpha 通道的模式；其余模式可能通过 info['transparency'] 带透明色
+ALPHA_MODES = ('RGBA', 'LA', 'PA')
+
+# 只读文件头得到的图片信息：dpi 为文件里记录的分辨率（没有为 None），passthrough 表示不缩小时能否直通
+ImageHeader = namedtuple('ImageHeader', 'width height mode format dpi passthrough', defaults=(None, False))
+
+# 影响输出内容的图片编码选项（会记入增量清单的设置）
+# background：透明图合成到该背景色（如 'white'、'#f0f0f0'）；None 时保留透明度，输出 SMask
+# max_dpi：按图片自带的 DPI 计算页面物理尺寸，超过该分辨率的图片缩小到该分辨率（页面尺寸不变）
+# max_size：图片最长边超过该像素数时等比缩小（页面尺寸不变）
+# frames：多帧图片（动图 WEBP/GIF、多页 TIFF、APNG）每帧一页；1 为全部帧，N 为每 N 帧取一帧，0 只取第一帧
+# quality / optimize / progressive：重新编码为 JPEG 时的质量（1-95）、优化哈夫曼表、渐进式；
+# flate_level：无损 Flate 编码的 zlib 压缩级别（0-9）；None 时默认用最快的 1，optimize 时用最高的 9
+ImageOptions = namedtuple('ImageOptions',
+                          'background max_dpi max_size frames quality optimize progressive flate_level',
+                          defaults=(None, None, None, 1, 75, False, False, None))
+DEFAULT_OPTIONS = ImageOptions()
+
+def read_jpeg_info(file_path):
+    """只读取 JPEG 的 SOF 头，返回 (宽, 高, 通道数, 是否 Adobe)；非 JPEG 或不能直通的 JPEG 返回 None"""
+    try:
+        with open(file_path, 'rb') as f:
+            return parse_jpeg_info(f)
+    except OSError:
+        return None
+
+def parse_jpeg_info(f):
+    """从文件对象开头解析 JPEG 的 SOF 头，规则同 read_jpeg_info"""
+    if f.read(2) != b'\xff\xd8':
+        return None
+    adobe = False
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+        marker = f.read(1)
+        while marker == b'\xff':
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code in (0x01, 0xD8) or 0xD0 <= code <= 0xD7:
+            continue
+        if code in (0xD9, 0xDA):
+            return None
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = int.from_bytes(length_bytes, 'big')
+        segment = f.read(length - 2)
+        if code == 0xEE and segment.startswith(b'Adobe'):
+            adobe = True
+        elif code in JPEG_SOF_MARKERS:
+            if len(segment) < 6 or code not in JPEG_PASSTHROUGH_MARKERS or segment[0] != 8:
+                return None
+            height = int.from_bytes(segment[1:3], 'big')
+            width = int.from_bytes(segment[3:5], 'big')
+            components = segment[5]
+            if width == 0 or height == 0 or components not in (1, 3, 4):
+                return None
+            return width, height, components, adobe
+
+def read_png_info(file_path):
+    """只读取 IDAT 之前的块头，返回 (宽, 高, 位深, 颜色类型, 是否隔行, 是否有 tRNS)，非 PNG 返回 None"""
+    try:
+        with open(file_path, 'rb') as f:
+            return parse_png_info(f)
+    except OSError:
+        return None
+
+def parse_png_info(f):
+    """从文件对象开头解析 PNG 头，规则同 read_png_info"""
+    head = f.read(33)
+    if len(head) < 33 or not head.startswith(PNG_SIGNATURE) or head[12:16] != b'IHDR':
+        return None
+    width, height, bits, color_type, _, _, interlace = struct.unpack('>IIBBBBB', head[16:29])
+    # tRNS 按规范必须出现在第一个 IDAT 之前，跳过块内容只看块头
+    transparent = False
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        length, chunk_type = struct.unpack('>I4s', chunk)
+        if chunk_type in (b'IDAT', b'IEND'):
+            break
+        if chunk_type == b'tRNS':
+            transparent = True
+            break
+        f.seek(length + 4, os.SEEK_CUR)
+    return width, height, bits, color_type, bool(interlace), transparent
+
+def can_passthrough_png(info):
+    """8 位及以下、非隔行、无透明信息的灰度/RGB/调色板 PNG 可以直通"""
+    _, _, bits, color_type, interlaced, transparent = info
+    return color_type in PNG_COLORSPACES and bits <= 8 and not interlaced and not transparent
+
+def frame_count(data):
+    """原始字节（bytes 或 mmap）的帧数：只有可能多帧的格式（GIF、TIFF、WEBP、PNG）才读文件头，其余返回 1"""
+    head = bytes(data[:12])
+    if not (head.startswith((b'GIF8', b'II*\x00', b'MM\x00*', PNG_SIGNATURE))
+            or (head[:4] == b'RIFF' and head[8:12] == b'WEBP')):
+        return 1
+    try:
+        with Image.open(input_file(data)) as img:
+            return getattr(img, 'n_frames', 1)
+    except Exception:
+        return 1  # 交给解码时报错
+
+def is_lossless_webp(data):
+    """原始字节是无损编码（VP8L 位流）的 WEBP 时返回 True；有损 WEBP 和其他格式返回 False"""
+    if bytes(data[:4]) != b'RIFF' or bytes(data[8:12]) != b'WEBP':
+        return False
+    pos = 12
+    while pos + 8 <= len(data):
+        fourcc, size = struct.unpack_from('<4sI', data, pos)
+        if fourcc == b'VP8L':
+            return True
+        if fourcc == b'VP8 ':
+            return False
+        if fourcc == b'ANMF':
+            pos += 8 + 16  # 动画帧：16 字节帧头之后是该帧的位流块
+            continue
+        pos += 8 + size + (size & 1)
+    return False
+
+def read_image_header(file_path):
+    """只读文件头，返回 ImageHeader（宽、高、模式、格式、DPI、能否直通），不解码像素；文件只打开一次"""
+    with open(file_path, 'rb') as f:
+        png = parse_png_info(f)
+        f.seek(0)
+        jpeg = parse_jpeg_info(f)
+        f.seek(0)
+        with Image.open(f) as img:
+            if img.format == 'JPEG':
+                passthrough = jpeg is not None
+            else:
+                passthrough = png is not None and can_passthrough_png(png)
+            return ImageHeader(img.width, img.height, img.mode, img.format, img.info.get('dpi'), passthrough)
+
+def read_input(file_path):
+    """读取整个输入文件：大文件返回只读 mmap，小文件返回 bytes
+
+    系统支持时都会提示内核按顺序预读（机械硬盘、网络盘上更快）；
+    mmap 另外请求提前换入，读线程返回后内核仍在后台读盘。
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            for advice in ('MADV_SEQUENTIAL', 'MADV_WILLNEED'):
+                if hasattr(mmap, advice):
+                    data.madvise(getattr(mmap, advice))
+            return data
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        return f.read()
+
+def input_file(data):
+    """把 read_input 的结果当作文件对象使用；mmap 本身就是文件对象，不复制"""
+    if isinstance(data, mmap.mmap):
+        data.seek(0)
+        return data
+    return io.BytesIO(data)
+
+def jpeg_to_pdf_image(data, info):
+    """JPEG 直通：原始字节作为 DCTDecode 图像，不解码不重编码"""
+    width, height, components, adobe = info
+    # Adobe 写入的 CMYK JPEG 是反相存储的
+    decode = [1, 0] * 4 if components == 4 and adobe else None
+    return PdfImage(data, width, height, JPEG_COLORSPACES[components], decode=decode)
+
+def read_png_stream(data):
+    """从 PNG 字节中取出 (IDAT 分段列表, PLTE 调色板或 None)；分段是原数据上的 memoryview，不复制"""
+    view = memoryview(data)
+    idat = []
+    palette = None
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack_from('>I4s', data, pos)
+        start = pos + 8
+        if start + length > len(data):
+            raise ValueError("PNG 文件被截断")
+        if chunk_type == b'IDAT':
+            idat.append(view[start:start + length])
+        elif chunk_type == b'PLTE':
+            palette = bytes(view[start:start + length])
+        elif chunk_type == b'IEND':
+            break
+        pos = start + length + 4  # 跳过 CRC
+    if not idat:
+        raise ValueError("PNG 缺少图像数据")
+    return idat, palette
+
+def png_decode_parms(colors, bits, width):
+    return b'<< /Predictor 15 /Colors %d /BitsPerComponent %d /Columns %d >>' % (colors, bits, width)
+
+def png_to_pdf_image(data, info):
+    """PNG 直通：IDAT 压缩流原样作为 FlateDecode 图像（PNG 预测器），调色板保持 Indexed"""
+    width, height, bits, color_type, _, _ = info
+    idat, palette = read_png_stream(data)
+    if color_type == 3 and not palette:
+        raise ValueError("PNG 缺少调色板")
+
+    colorspace, colors = PNG_COLORSPACES[color_type]
+    if color_type == 3:
+        colorspace = b'[/Indexed /DeviceRGB %d <%s>]' % (len(palette) // 3 - 1, palette.hex().encode())
+    return PdfImage(idat, width, height, colorspace, bits, b'/FlateDecode',
+                    decode_parms=png_decode_parms(colors, bits, width))
+
+def source_dpi(info, options):
+    """换算页面尺寸用的分辨率：max_dpi 模式取图片自带的 DPI（没有或不合理时用默认分辨率）"""
+    if options.max_dpi:
+        dpi = info.get('dpi')
+        if dpi and dpi[0] >= 10:
+            return float(dpi[0])
+    return DEFAULT_RESOLUTION
+
+def target_size(width, height, dpi, options):
+    """按 max_dpi / max_size 计算缩小后的像素尺寸，不需要缩小时返回 None"""
+    scale = 1.0
+    if options.max_dpi and dpi > options.max_dpi:
+        scale = options.max_dpi / dpi
+    if options.max_size:
+        scale = min(scale, options.max_size / max(width, height))
+    if scale >= 1.0:
+        return None
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def downsample(img, size):
+    """缩小到 size：reducing_gap 让 Pillow 先用 reduce() 整数倍快速缩小，再做一次精细重采样"""
+    if img.mode in ('1', 'P'):
+        # 调色板/二值图只能最近邻缩放，先展开成连续色调
+        img = img.convert('RGBA' if has_alpha(img) else 'L' if img.mode == '1' else 'RGB')
+    return img.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+def has_alpha(img):
+    return img.mode in ALPHA_MODES or 'transparency' in img.info
+
+def split_alpha(img):
+    """拆成 (颜色图, alpha 通道)：各自只按通道拷贝一次，灰度透明图的颜色保持 L"""
+    if img.mode not in ALPHA_MODES:
+        img = img.convert('RGBA')  # 调色板/灰度/RGB 的透明色展开为 alpha 通道
+    return img.convert('L' if img.mode == 'LA' else 'RGB'), img.getchannel('A')
+
+def flatten(img, background='white'):
+    """快速路径：一次 paste 把透明图按 alpha 合成到背景色上（灰度图配灰色背景时保持 L）"""
+    color = ImageColor.getrgb(background)[:3]
+    mode = 'L' if img.mode == 'LA' and len(set(color)) == 1 else 'RGB'
+    if img.mode != ('LA' if mode == 'L' else 'RGBA'):
+        img = img.convert('RGBA')
+    canvas = Image.new(mode, img.size, color[0] if mode == 'L' else color)
+    canvas.paste(img, mask=img)
+    return canvas
+
+def flate_level(options=DEFAULT_OPTIONS):
+    """Flate 编码实际使用的 zlib 压缩级别"""
+    if options.flate_level is not None:
+        return options.flate_level
+    return 9 if options.optimize else 1
+
+def encode_flate(img, options=DEFAULT_OPTIONS):
+    """L/RGB 图无损编码为 FlateDecode：借 Pillow 的 PNG 编码器（带预测器），IDAT 直接作为图像流"""
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG', compress_level=flate_level(options))
+    idat, _ = read_png_stream(buffer.getvalue())
+    colors = len(img.getbands())
+    return PdfImage(idat, img.width, img.height, JPEG_COLORSPACES[colors], 8, b'/FlateDecode',
+                    decode_parms=png_decode_parms(colors, 8, img.width))
+
+def encode_smask(alpha, options=DEFAULT_OPTIONS):
+    """alpha 通道编码为 DeviceGray 软蒙版（Flate，无损）"""
+    return encode_flate(alpha, options)
+
+def jpeg_params(options=DEFAULT_OPTIONS):
+    """Pillow 保存 JPEG 的参数（Pillow 自带 libjpeg-turbo）"""
+    return {'quality': options.quality, 'optimize': options.optimize, 'progressive': options.progressive}
+
+def pil_to_pdf_image(img, options=DEFAULT_OPTIONS, tracer=NULL_TRACER, source_size=None, name=None,
+                     lossless=False):
+    """Pillow 路径：按需缩小，颜色编码为 JPEG（灰度图保持灰度），透明度输出为 SMask 或合成到背景色
+
+    source_size 为原图像素尺寸（img 已用 draft 缩小解码时传入），页面尺寸和缩放目标都按原图计算。
+    lossless=True（源图是无损 WEBP）时颜色改用 Flate 无损编码，不引入 JPEG 损失。
+    encode 事件记录编码方式、像素数和输出字节数，用于逐张的编码报告。
+    """
+    dpi = None
+    if options.max_dpi or options.max_size:
+        width, height = source_size or img.size
+        dpi = source_dpi(img.info, options)
+        size = target_size(width, height, dpi, options)
+        if size is not None:
+            dpi = (dpi * size[0] / width, dpi * size[1] / height)  # 页面物理尺寸保持不变
+            if img.size != size:
+                with tracer.span('resize') as record:
+                    img = downsample(img, size)
+                    record['bytes'] = img.width * img.height * len(img.getbands())
+    alpha = None
+    with tracer.span('convert') as record:
+        if not has_alpha(img):
+            color = img if img.mode in ('L', 'RGB') else img.convert('L' if img.mode == '1' else 'RGB')
+        elif options.background is not None:
+            color = flatten(img, options.background)
+        else:
+            color, alpha = split_alpha(img)
+            if alpha.getextrema()[0] == 255:
+                alpha = None  # 完全不透明，不需要蒙版
+        record['bytes'] = color.width * color.height * len(color.getbands())
+    with tracer.span('encode', file=name) as record:
+        if lossless:
+            image = encode_flate(color, options)
+        else:
+            buffer = io.BytesIO()
+            color.save(buffer, format='JPEG', **jpeg_params(options))
+            image = PdfImage(buffer.getvalue(), color.width, color.height, JPEG_COLORSPACES[len(color.getbands())])
+        image.smask = encode_smask(alpha, options) if alpha is not None else None
+        image.dpi = dpi
+        record['codec'] = 'flate' if lossless else 'jpeg'
+        record['pixels'] = color.width * color.height
+        record['bytes'] = image.length + (image.smask.length if image.smask else 0)
+    return image
+
+def estimate_memory(file_path, header=None, options=DEFAULT_OPTIONS, file_size=None):
+    """只读文件头估算加载一张图片的峰值内存（字节），可传入扫描时已读好的 header 和文件大小
+
+    options 的 max_dpi / max_size 要求缩小的图片不能直通，按解码估算（JPEG 按 draft 缩小后的尺寸）。
+    """
+    if file_size is None:
+        file_size = os.path.getsize(file_path)
+    try:
+        header = header or read_image_header(file_path)
+    except Exception:
+        return file_size
+    size = None
+    if options.max_dpi or options.max_size:
+        dpi = source_dpi({'dpi': header.dpi}, options)
+        size = target_size(header.width, header.height, dpi, options)
+    if size is None and header.passthrough:
+        # 直通：JPEG 只持有原始字节，PNG 另有拼接后的 IDAT
+        return file_size if header.format == 'JPEG' else file_size * 2
+    width, height = header.width, header.height
+    bands = Image.getmodebands(header.mode)
+    extra = 0
+    if size is not None:
+        if header.format == 'JPEG':
+            # 同 Pillow 的 draft：按不大于缩小倍数的 1/2、1/4、1/8 解码
+            scale = min(width // size[0], height // size[1])
+            factor = next(f for f in (8, 4, 2, 1) if scale >= f)
+            width, height = -(-width // factor), -(-height // factor)
+        extra = size[0] * size[1] * bands  # 缩小后的副本
+    # 解码位图 + RGB 副本（透明图再加 alpha 通道）+ 编码结果（按原文件大小估计）
+    copies = 4 if header.mode in ALPHA_MODES else 3
+    return width * height * (bands + copies) + extra + file_size
+
+def passthrough_image(data, tracer=NULL_TRACER, name=None, options=DEFAULT_OPTIONS):
+    """原始字节（bytes 或 mmap）是可直通的 JPEG/PNG 时返回 PdfImage，否则返回 None
+
+    设置了 max_dpi / max_size 且图片需要缩小时不能直通，返回 None。
+    """
+    try:
+        info = parse_jpeg_info(input_file(data))
+        if info is not None:
+            convert = jpeg_to_pdf_image
+        else:
+            info = parse_png_info(input_file(data))
+            if info is None or not can_passthrough_png(info):
+                return None
+            convert = png_to_pdf_image
+    except ValueError:  # mmap 上越界 seek（文件被截断），交给 Pillow 报错
+        return None
+    dpi = None
+    if options.max_dpi or options.max_size:
+        # 只读文件头里的 DPI，不解码像素
+        with Image.open(input_file(data)) as img:
+            dpi = source_dpi(img.info, options)
+        if target_size(info[0], info[1], dpi, options) is not None:
+            return None
+    with tracer.span('passthrough', file=name) as record:
+        image = convert(data, info)
+        image.dpi = dpi
+        record['bytes'] = image.length
+    return image
+
+def decode_pdf_image(data, options=DEFAULT_OPTIONS, tracer=NULL_TRACER, name=None):
+    """Pillow 解码原始字节（bytes 或 mmap）并编码为 PdfImage（不能直通的图片）"""
+    with tracer.span('decode', file=name) as record:
+        img = Image.open(input_file(data))
+        source_size = img.size
+        if img.format == 'JPEG' and (options.max_dpi or options.max_size):
+            # 需要缩小时让 DCT 解码器直接按 1/2、1/4 或 1/8 解码（结果不小于目标尺寸）
+            size = target_size(img.width, img.height, source_dpi(img.info, options), options)
+            if size is not None:
+                img.draft(img.mode, size)
+                record['draft'] = img.size != source_size
+        img.load()
+        record['bytes'] = len(data)
+    with img:
+        return pil_to_pdf_image(img, options, tracer, source_size, name, is_lossless_webp(data))
+
+def iter_frame_images(data, options=DEFAULT_OPTIONS, tracer=NULL_TRACER, name=None, key=None):
+    """多帧图片逐帧解码、编码，按 options.frames 选帧，产出 PdfImage（某一帧出错时产出异常并结束）
+
+    ImageSequence 按需 seek，同一时间只有当前帧的位图在内存里；key 为文件内容哈希时每帧带上 key#帧号。
+    """
+    step = max(options.frames, 1)
+    lossless = is_lossless_webp(data)
+    try:
+        with Image.open(input_file(data)) as img:
+            for index, frame in enumerate(ImageSequence.Iterator(img)):
+                if index % step:
+                    continue
+                with tracer.span('decode', file=name, frame=index) as record:
+                    frame.load()
+                    record['bytes'] = frame.width * frame.height * len(frame.getbands())
+                image = pil_to_pdf_image(frame, options, tracer, name=name, lossless=lossless)
+                if key is not None:
+                    image.key = f"{key}#{index}"
+                yield image
+    except Exception as e:
+        yield e
+
+def load_pdf_image(file_path, options=DEFAULT_OPTIONS, tracer=NULL_TRACER):
+    """读取一张图片并编码为可写入 PDF 的图像对象（文件只读一次）"""
+    name = os.path.basename(file_path)
+    with tracer.span('read', file=name) as record:
+        data = read_input(file_path)
+        record['bytes'] = len(data)
+    image = passthrough_image(data, tracer, name, options)
+    if image is not None:
+        return image
+    return decode_pdf_image(data, options, tracer, name)
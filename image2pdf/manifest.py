@@ -0,0 +1,136 @@
+import os
+import json
+import hashlib
+import threading
+
+from .checkpoint import pending_append
+
+# 增量重建清单：记录每个文件夹的输入文件（路径、大小、mtime、内容哈希）和输出设置
+MANIFEST_NAME = '.image2pdf-manifest.json'
+MANIFEST_VERSION = 1
+
+def file_hash(file_path, chunk_size=1 << 20):
+    """文件内容哈希（blake2b-128）"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class Manifest:
+    """按文件夹记录上次转换的输入与输出，判断能否跳过或只追加新页面"""
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+        self._folders = {}
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self._folders = data.get('folders', {})
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def _key(input_folder):
+        return os.path.normcase(os.path.abspath(input_folder))
+
+    def _same_file(self, old, entry):
+        """大小和 mtime 一致视为未变；mtime 变了但大小相同时再比对内容哈希"""
+        if old['path'] != entry.name or old['size'] != entry.size:
+            return False
+        if old['mtime'] == entry.mtime_ns:
+            return True
+        if file_hash(entry.path) != old['hash']:
+            return False
+        old['mtime'] = entry.mtime_ns
+        return True
+
+    def plan(self, input_folder, entries, output_pdf_path, settings):
+        """根据扫描得到的 ImageEntry 列表返回 ('skip' | 'append' | 'build', 需要转换的起始下标)
+
+        大小和 mtime 直接取自扫描结果，未变化的文件夹不需要再读任何文件。
+        """
+        with self._lock:
+            record = self._folders.get(self._key(input_folder))
+        if not record or record['settings'] != settings or record['output'] != os.path.abspath(output_pdf_path):
+            return 'build', 0
+
+        # 输出 PDF 被删除或改动过就必须重建
+        try:
+            st = os.stat(output_pdf_path)
+        except OSError:
+            return 'build', 0
+        if st.st_size != record['output_size'] or st.st_mtime_ns != record['output_mtime']:
+            # 例外：上次原地追加被中断并留下断点，追加起点之前仍是记录的那个 PDF，可以接着追加
+            if pending_append(output_pdf_path) != record['output_size']:
+                return 'build', 0
+
+        old_files = record['files']
+        if len(entries) < len(old_files):
+            return 'build', 0
+        try:
+            for old, entry in zip(old_files, entries):
+                if not self._same_file(old, entry):
+                    return 'build', 0
+        except OSError:
+            return 'build', 0
+
+        if len(entries) == len(old_files):
+            return 'skip', 0
+        # 只在末尾新增了图片：流式引擎可以增量追加页面
+        if settings.get('engine') == 'stream':
+            return 'append', len(old_files)
+        return 'build', 0
+
+    def update(self, input_folder, entries, output_pdf_path, settings, pages=0, hashes=None):
+        """转换成功后记录本次的输入和输出状态；已记录且未变的文件沿用旧哈希
+
+        hashes（路径 → 内容哈希）为转换时已算好的哈希，其余文件才重新读取计算。
+        """
+        hashes = hashes or {}
+        key = self._key(input_folder)
+        with self._lock:
+            old_record = self._folders.get(key)
+        known = {}
+        if old_record and old_record['settings'] == settings:
+            known = {(f['path'], f['size'], f['mtime']): f['hash'] for f in old_record['files']}
+
+        files = []
+        for entry in entries:
+            file_hash_value = (known.get((entry.name, entry.size, entry.mtime_ns)) or hashes.get(entry.path)
+                               or file_hash(entry.path))
+            files.append({'path': entry.name, 'size': entry.size, 'mtime': entry.mtime_ns,
+                          'hash': file_hash_value})
+
+        st = os.stat(output_pdf_path)
+        record = {
+            'output': os.path.abspath(output_pdf_path),
+            'output_size': st.st_size,
+            'output_mtime': st.st_mtime_ns,
+            'pages': pages,
+            'settings': settings,
+            'files': files,
+        }
+        with self._lock:
+            self._folders[key] = record
+            self._save()
+
+    def pages(self, input_folder):
+        """上次记录的输出页数"""
+        with self._lock:
+            record = self._folders.get(self._key(input_folder))
+        return record.get('pages', 0) if record else 0
+
+    def forget(self, input_folder):
+        with self._lock:
+            if self._folders.pop(self._key(input_folder), None) is not None:
+                self._save()
+
+    def _save(self):
+        """先写临时文件再替换，避免中断时留下损坏的清单"""
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'folders': self._folders}, f, ensure_ascii=False)
+        os.replace(temp_path, self.manifest_path)
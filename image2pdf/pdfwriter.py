@@ -0,0 +1,290 @@
+import os
+import re
+
+# 单遍流式 PDF 写入：页面对象写完即落盘，内存中只保留对象偏移表
+
+# 默认分辨率：页面尺寸 = 像素 / 100 英寸
+DEFAULT_RESOLUTION = 100.0
+
+class PdfImage:
+    """一个待写入 PDF 的图像 XObject（已编码好的数据 + 描述参数）
+
+    data 可以是 bytes 类对象（含 mmap），也可以是分段列表（如 PNG 的各个 IDAT），写入时依次输出不拼接。
+    """
+
+    def __init__(self, data, width, height, colorspace=b'/DeviceRGB',
+                 bits=8, filter=b'/DCTDecode', decode=None, decode_parms=None, smask=None, dpi=None, key=None):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.colorspace = colorspace
+        self.bits = bits
+        self.filter = filter
+        self.decode = decode
+        self.decode_parms = decode_parms
+        self.smask = smask  # 透明度蒙版（DeviceGray 的 PdfImage）
+        self.dpi = dpi  # 页面尺寸按该分辨率（数值或 (横向, 纵向)）换算；None 时用写入器的分辨率
+        self.key = key  # 源文件内容哈希；写入器据此让重复的图片共用一个 XObject
+
+    def __getstate__(self):
+        # memoryview / mmap 不能 pickle：跨进程传递时拼成 bytes
+        state = self.__dict__.copy()
+        state['data'] = b''.join(self.segments)
+        return state
+
+    @property
+    def segments(self):
+        return self.data if isinstance(self.data, (list, tuple)) else (self.data,)
+
+    @property
+    def length(self):
+        return sum(len(segment) for segment in self.segments)
+
+class PdfStreamWriter:
+    """流式 PDF 写入器：逐页追加对象，关闭时写出页面树、xref 和 trailer"""
+
+    CATALOG = 1
+    PAGES = 2
+
+    def __init__(self, output_pdf_path, resolution=DEFAULT_RESOLUTION, append=False):
+        """append=True 时以增量更新方式在本写入器生成的 PDF 末尾追加页面"""
+        self.output_pdf_path = output_pdf_path
+        self.resolution = resolution
+        self._offsets = {}  # 对象编号 -> 文件偏移（仅本次写入的对象）
+        self._prev_xref = None
+        self._images = {}  # 图像内容哈希 -> 已写入的 XObject 编号
+        self.shared_images = 0  # 复用已有 XObject 的页面数
+        self._reset_unsaved()
+        if append:
+            self._open_append()
+        else:
+            self._file = open(output_pdf_path, 'wb')
+            self._append_from = None
+            self._next_num = 3  # 1/2 预留给 Catalog/Pages
+            self._pages = []
+            self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _open_append(self):
+        """读取已有 PDF 的 trailer、xref 和页面树，准备增量追加"""
+        self._file = open(self.output_pdf_path, 'r+b')
+        try:
+            self._append_from = self._file.seek(0, os.SEEK_END)
+            self._file.seek(max(0, self._append_from - 1024))
+            tail = self._file.read()
+            match = re.search(rb'startxref\s+(\d+)\s+%%EOF\s*$', tail)
+            trailers = re.findall(rb'trailer\s*<<(.*?)>>', tail, re.S)
+            if not match or not trailers:
+                raise ValueError("无法识别的 PDF 结尾")
+            self._prev_xref = int(match.group(1))
+            self._next_num = int(re.search(rb'/Size (\d+)', trailers[-1]).group(1))
+
+            # 最新的 xref 段一定包含最近一次写入的页面树对象
+            pages_offset = self._read_xref_entry(self._prev_xref, self.PAGES)
+            self._file.seek(pages_offset)
+            body = b''
+            while b'endobj' not in body:
+                chunk = self._file.read(65536)
+                if not chunk:
+                    raise ValueError("页面树对象不完整")
+                body += chunk
+            kids = re.search(rb'/Kids \[([^\]]*)\]', body)
+            if not kids:
+                raise ValueError("找不到页面树")
+            self._pages = [int(num) for num in re.findall(rb'(\d+) 0 R', kids.group(1))]
+            self._file.seek(self._append_from)
+        except Exception:
+            self._file.close()
+            raise
+
+    def _reset_unsaved(self, saved_pages=0):
+        """从这里开始记录下一次 checkpoint() 的增量；前 saved_pages 页已记录过"""
+        self._unsaved_offsets = []
+        self._unsaved_images = {}
+        self._saved_pages = saved_pages
+
+    def checkpoint(self):
+        """把已写内容落盘（fsync），返回自上次 checkpoint() 以来的状态增量（可 JSON 序列化）
+
+        offsets / pages / images 只含新增的部分，其余为当前值；按 checkpoint.merge_state
+        依次合并各次的增量即得到完整状态，交给 resume() 续写。开销只与新写的页面数有关。
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        state = {
+            'position': self._file.tell(),
+            'offsets': self._unsaved_offsets,
+            'next_num': self._next_num,
+            'pages': self._pages[self._saved_pages:],
+            'prev_xref': self._prev_xref,
+            'append_from': self._append_from,
+            'images': self._unsaved_images,
+        }
+        self._reset_unsaved(len(self._pages))
+        return state
+
+    @classmethod
+    def resume(cls, output_pdf_path, state, resolution=DEFAULT_RESOLUTION):
+        """打开未完成的文件，丢弃断点之后写入的内容，从 checkpoint() 的状态继续"""
+        writer = cls.__new__(cls)
+        writer.output_pdf_path = output_pdf_path
+        writer.resolution = resolution
+        writer._offsets = {num: offset for num, offset in state['offsets']}
+        writer._next_num = state['next_num']
+        writer._pages = list(state['pages'])
+        writer._prev_xref = state['prev_xref']
+        writer._append_from = state['append_from']
+        writer._images = dict(state.get('images', {}))
+        writer.shared_images = 0
+        writer._reset_unsaved(len(writer._pages))
+        writer._file = open(output_pdf_path, 'r+b')
+        writer._file.truncate(state['position'])
+        writer._file.seek(state['position'])
+        return writer
+
+    def _read_xref_entry(self, xref_offset, num):
+        """在 xref 段中查找对象偏移"""
+        self._file.seek(xref_offset)
+        if self._file.readline().strip() != b'xref':
+            raise ValueError("不支持的 xref 格式")
+        while True:
+            header = self._file.readline().split()
+            if not header or header[0] == b'trailer':
+                raise ValueError(f"xref 中没有对象 {num}")
+            start, count = int(header[0]), int(header[1])
+            if start <= num < start + count:
+                self._file.seek((num - start) * 20, os.SEEK_CUR)
+                return int(self._file.read(10))
+            self._file.seek(count * 20, os.SEEK_CUR)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def page_count(self):
+        return len(self._pages)
+
+    @property
+    def bytes_written(self):
+        return self._file.tell()
+
+    def _new_object(self):
+        num = self._next_num
+        self._next_num += 1
+        return num
+
+    def _write_object(self, num, body, stream=None):
+        out = self._file
+        self._offsets[num] = out.tell()
+        self._unsaved_offsets.append((num, self._offsets[num]))
+        out.write(b'%d 0 obj\n' % num)
+        out.write(body)
+        if stream is not None:
+            out.write(b'\nstream\n')
+            out.writelines(stream if isinstance(stream, (list, tuple)) else (stream,))
+            out.write(b'\nendstream')
+        out.write(b'\nendobj\n')
+
+    def add_image(self, image):
+        """写入图像 XObject（有 smask 时先写蒙版），返回对象编号"""
+        smask_num = self.add_image(image.smask) if image.smask is not None else None
+        num = self._new_object()
+        entries = [
+            b'/Type /XObject /Subtype /Image',
+            b'/Width %d /Height %d' % (image.width, image.height),
+            b'/ColorSpace %s /BitsPerComponent %d' % (image.colorspace, image.bits),
+        ]
+        if image.filter:
+            entries.append(b'/Filter %s' % image.filter)
+        if image.decode_parms:
+            entries.append(b'/DecodeParms %s' % image.decode_parms)
+        if image.decode:
+            entries.append(b'/Decode [%s]' % b' '.join(b'%d' % v for v in image.decode))
+        if smask_num is not None:
+            entries.append(b'/SMask %d 0 R' % smask_num)
+        entries.append(b'/Length %d' % image.length)
+        self._write_object(num, b'<< %s >>' % b' '.join(entries), image.segments)
+        return num
+
+    def add_page(self, image_num, width, height, dpi=None):
+        """新增一页，图像铺满整页，页面尺寸按分辨率（默认为写入器的分辨率）由像素换算"""
+        dpi_x, dpi_y = dpi if isinstance(dpi, tuple) else (dpi or self.resolution,) * 2
+        page_width = width * 72.0 / dpi_x
+        page_height = height * 72.0 / dpi_y
+
+        content = b'q %.4f 0 0 %.4f 0 0 cm /Im0 Do Q' % (page_width, page_height)
+        content_num = self._new_object()
+        self._write_object(content_num, b'<< /Length %d >>' % len(content), content)
+
+        page_num = self._new_object()
+        self._write_object(page_num, b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.4f %.4f] '
+                           b'/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>'
+                           % (self.PAGES, page_width, page_height, image_num, content_num))
+        self._pages.append(page_num)
+        return page_num
+
+    def add_image_page(self, image):
+        """写入图像并新增一页；key 相同的图像只写一次，之后的页面引用同一个 XObject"""
+        image_num = self._images.get(image.key) if image.key is not None else None
+        if image_num is None:
+            image_num = self.add_image(image)
+            if image.key is not None:
+                self._images[image.key] = image_num
+                self._unsaved_images[image.key] = image_num
+        else:
+            self.shared_images += 1
+        return self.add_page(image_num, image.width, image.height, image.dpi)
+
+    def close(self):
+        """写出页面树、Catalog、xref 和 trailer，完成文件"""
+        if self._file.closed:
+            return
+        kids = b' '.join(b'%d 0 R' % num for num in self._pages)
+        self._write_object(self.PAGES, b'<< /Type /Pages /Kids [%s] /Count %d >>'
+                           % (kids, len(self._pages)))
+        if self._prev_xref is None:
+            self._write_object(self.CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % self.PAGES)
+
+        out = self._file
+        xref_offset = out.tell()
+        entries = [(0, None)] + sorted(self._offsets.items())
+        out.write(b'xref\n')
+        # 按连续编号分段；增量更新时只列出本次新写的对象（0 号空闲项每段都带上）
+        start = 0
+        while start < len(entries):
+            end = start + 1
+            while end < len(entries) and entries[end][0] == entries[end - 1][0] + 1:
+                end += 1
+            out.write(b'%d %d\n' % (entries[start][0], end - start))
+            for _, offset in entries[start:end]:
+                out.write(b'0000000000 65535 f \n' if offset is None else b'%010d 00000 n \n' % offset)
+            start = end
+
+        prev = b'' if self._prev_xref is None else b' /Prev %d' % self._prev_xref
+        out.write(b'trailer\n<< /Size %d /Root %d 0 R%s >>\nstartxref\n%d\n%%%%EOF\n'
+                  % (self._next_num, self.CATALOG, prev, xref_offset))
+        out.close()
+
+    def detach(self):
+        """关闭文件但保留已写入的内容（留给 resume 续写）"""
+        if not self._file.closed:
+            self._file.close()
+
+    def abort(self):
+        """放弃写入：新文件直接删除，追加模式则截断回原来的长度"""
+        if self._append_from is not None:
+            if not self._file.closed:
+                self._file.truncate(self._append_from)
+                self._file.close()
+            return
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.output_pdf_path)
+        except OSError:
+            pass
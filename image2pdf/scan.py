@@ -0,0 +1,51 @@
+import os
+import re
+
+from .images import read_image_header
+
+# 目录扫描：os.scandir 一次拿到文件名和大小，图片头按需懒读取
+
+_split_digits = re.compile(r'(\d+)').split
+
+def natural_sort_key(s):
+    """自然排序算法（正则预编译，奇数位恒为数字段）"""
+    parts = _split_digits(s.lower())
+    parts[1::2] = map(int, parts[1::2])
+    return parts
+
+class ImageEntry:
+    """扫描到的一张图片；大小/mtime 和图片头都在首次访问时才读取"""
+
+    __slots__ = ('path', 'name', '_dir_entry', '_header')
+
+    def __init__(self, dir_entry):
+        self.path = dir_entry.path
+        self.name = dir_entry.name
+        self._dir_entry = dir_entry
+        self._header = None
+
+    @property
+    def size(self):
+        return self._dir_entry.stat().st_size  # DirEntry 会缓存 stat 结果
+
+    @property
+    def mtime_ns(self):
+        return self._dir_entry.stat().st_mtime_ns
+
+    @property
+    def header(self):
+        if self._header is None:
+            self._header = read_image_header(self.path)
+        return self._header
+
+def iter_image_entries(input_folder, formats):
+    """按目录顺序逐个产出图片（不排序），目录还没列完就可以开始处理"""
+    suffixes = tuple(f.lower() for f in formats)
+    with os.scandir(input_folder) as it:
+        for dir_entry in it:
+            if dir_entry.name.lower().endswith(suffixes) and dir_entry.is_file():
+                yield ImageEntry(dir_entry)
+
+def scan_folder(input_folder, formats):
+    """列出文件夹中指定格式的图片，按自然顺序排序"""
+    return sorted(iter_image_entries(input_folder, formats), key=lambda e: natural_sort_key(e.name))
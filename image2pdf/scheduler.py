@@ -0,0 +1,181 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .budget import Budget
+from .control import ConversionControl
+from .core import DEFAULT_READERS, ENGINES, convert_files, start_decode_pool
+from .dedup import reserve_cache_memory
+from .images import DEFAULT_OPTIONS
+from .scan import scan_folder
+from .trace import NULL_TRACER
+
+# largest：大文件夹先做（缩短总耗时）；smallest：小文件夹先做（尽快出结果）；given：保持原顺序
+JOB_ORDERS = ('largest', 'smallest', 'given')
+# 没有可转换图片的任务：missing 文件夹不存在，empty 文件夹里没有指定格式的图片（都算失败，不转换）
+NO_INPUT_ACTIONS = ('missing', 'empty')
+
+class FolderJob:
+    """一个文件夹 → 一个 PDF 的转换任务"""
+
+    def __init__(self, input_folder, output_pdf_path, entries):
+        self.input_folder = input_folder
+        self.output_pdf_path = output_pdf_path
+        self.entries = entries
+        self.image_files = [entry.path for entry in entries]
+        self.name = os.path.basename(os.path.normpath(input_folder))
+        self.total_bytes = sum(entry.size for entry in entries)
+        self.action = 'build'  # build / append / skip（由增量清单决定），或 NO_INPUT_ACTIONS 之一
+        self.success = None
+        self.pages = 0
+        self.output_bytes = 0
+        self.seconds = 0.0
+
+def check_outputs(folder_outputs):
+    """两个文件夹输出到同一个 PDF 时抛出 ValueError（后转换的会覆盖先转换的，同时转换时断点文件也会互相冲突）"""
+    seen = {}
+    for input_folder, output_pdf_path in folder_outputs:
+        key = os.path.normcase(os.path.abspath(output_pdf_path))
+        if key in seen:
+            raise ValueError(f"文件夹 {seen[key]} 和 {input_folder} 会输出到同一个文件 {output_pdf_path}，"
+                             f"请重命名其中一个或分开转换")
+        seen[key] = input_folder
+
+def plan_jobs(folder_outputs, formats, order='largest', tracer=NULL_TRACER, log_callback=print):
+    """为 (输入文件夹, 输出 PDF) 列表建立任务并排序
+
+    不存在或没有图片的文件夹也返回任务（action 为 'missing' / 'empty'，success 为 False，排在最后），
+    调用方可以据此报告；run_jobs 不会转换它们。两个文件夹输出到同一个 PDF 时抛出 ValueError。
+    """
+    if order not in JOB_ORDERS:
+        raise ValueError(f"未知调度顺序: {order}（可选 {', '.join(JOB_ORDERS)}）")
+    folder_outputs = list(folder_outputs)
+    check_outputs(folder_outputs)
+
+    jobs, no_input = [], []
+    for input_folder, output_pdf_path in folder_outputs:
+        if not os.path.isdir(input_folder):
+            log_callback(f"⚠️ 文件夹不存在: {input_folder}")
+            action, entries = 'missing', []
+        else:
+            with tracer.span('list', folder=input_folder) as record:
+                entries = scan_folder(input_folder, formats)
+                record['files'] = len(entries)
+            action = None if entries else 'empty'
+            if not entries:
+                log_callback(f"⚠️ 无 {formats} 文件: {input_folder}")
+        job = FolderJob(input_folder, output_pdf_path, entries)
+        if action is not None:
+            job.action, job.success = action, False
+            no_input.append(job)
+        else:
+            jobs.append(job)
+
+    if order != 'given':
+        jobs.sort(key=lambda job: job.total_bytes, reverse=(order == 'largest'))
+    return jobs + no_input
+
+def run_jobs(jobs, max_jobs=1, workers=1, engine='stream', batch_size=50, max_memory=None,
+             manifest=None, options=DEFAULT_OPTIONS, readers=DEFAULT_READERS, tracer=NULL_TRACER,
+             resume=True, cache=None, control=None, executor=None, progress_callback=None, log_callback=print):
+    """同时转换多个文件夹，所有任务共享一个进程池和内存预算（max_memory 字节）
+
+    每个任务用 readers 个线程预读原始字节，读盘与解码/编码重叠进行。
+    传入 manifest 时跳过未变化的文件夹，只在末尾新增图片的文件夹增量追加页面。
+    options 为 ImageOptions 编码选项，变化后相应文件夹会完整重建。
+    resume=True 时上次中断留下断点的文件夹从断点继续，否则丢弃断点重新转换。
+    cache（ImageCache）在所有文件夹间共享：内容相同的图片整次运行只编码一次；设了 max_memory 时
+    缓存最多占预算的 1/4（见 reserve_cache_memory），在途图片用剩下的部分。
+    control（ConversionControl）可暂停/取消所有任务，取消时抛出 ConversionCancelled；
+    主线程收到 Ctrl-C 时同样通知各任务在下一张图片前停下并保存断点，再抛出 KeyboardInterrupt。
+    传入 executor 时使用调用方的解码进程池（多次调用共用，结束时不关闭），否则 workers > 1 时临时创建。
+    progress_callback(job, 百分比) 按任务报告进度；日志加上文件夹名前缀；tracer 接收各阶段计时事件。
+    返回按完成顺序排列的任务列表（没有图片的任务原样返回，不转换）。
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"未知引擎: {engine}（可选 {', '.join(ENGINES)}）")
+    if all(job.action in NO_INPUT_ACTIONS for job in jobs):
+        return list(jobs)
+
+    # 影响输出内容的设置，变化后必须重建
+    settings = {'engine': engine, **options._asdict()}
+    max_jobs = max(1, min(max_jobs, len(jobs)))
+    # 去重缓存的内存也计入预算，在途图片只能用剩下的部分
+    max_memory = reserve_cache_memory(cache, max_memory)
+    budget = Budget(max_memory) if max_memory else None
+    own_executor = executor is None and workers > 1
+    if own_executor:
+        executor = start_decode_pool(workers)
+    control = control or ConversionControl()
+
+    def run(job):
+        def job_log(message):
+            log_callback(f"[{job.name}] {message.lstrip()}" if max_jobs > 1 else message)
+
+        def job_progress(percent):
+            if progress_callback:
+                progress_callback(job, percent)
+
+        if job.action in NO_INPUT_ACTIONS:
+            return job
+        control.checkpoint()  # 排队中的任务取消后不再开始
+        start_time = time.time()
+        start = 0
+        if manifest is not None:
+            with tracer.span('manifest', folder=job.name):
+                job.action, start = manifest.plan(job.input_folder, job.entries, job.output_pdf_path, settings)
+        if job.action == 'skip':
+            job_log(f"⏭️ 未变化，跳过: {job.name}")
+            job_progress(100)
+            job.success = True
+            job.pages = manifest.pages(job.input_folder)
+            job.output_bytes = os.path.getsize(job.output_pdf_path)
+            return job
+
+        job_log(f"📂 开始处理: {job.name}")
+        entries = {entry.path: entry for entry in job.entries}  # 内存估算复用扫描时读好的图片头
+        hashes = {}  # 去重时算过的内容哈希，写增量清单时复用
+        pages = convert_files(job.image_files[start:], job.output_pdf_path, batch_size, engine, workers,
+                              executor=executor, budget=budget, append=(job.action == 'append'),
+                              options=options, readers=readers, tracer=tracer, resume=resume, cache=cache,
+                              control=control, progress_callback=job_progress, log_callback=job_log,
+                              entries=entries, hashes=hashes)
+        if job.action == 'append' and pages is None:
+            job_log("⚠️ 增量追加失败，改为完整重建")
+            job.action = 'build'
+            pages = convert_files(job.image_files, job.output_pdf_path, batch_size, engine, workers,
+                                  executor=executor, budget=budget, options=options, readers=readers,
+                                  tracer=tracer, resume=resume, cache=cache, control=control,
+                                  progress_callback=job_progress, log_callback=job_log, entries=entries,
+                                  hashes=hashes)
+        job.success = pages is not None
+        if job.success:
+            job.pages = pages
+            job.output_bytes = os.path.getsize(job.output_pdf_path)
+        if manifest is not None:
+            if job.success:
+                with tracer.span('manifest', folder=job.name):
+                    manifest.update(job.input_folder, job.entries, job.output_pdf_path, settings, pages,
+                                    hashes)
+            else:
+                manifest.forget(job.input_folder)
+        job.seconds = time.time() - start_time
+        return job
+
+    finished = []
+    try:
+        # 线程池按提交顺序取任务，jobs 的排序即调度顺序
+        with ThreadPoolExecutor(max_workers=max_jobs) as threads:
+            futures = [threads.submit(run, job) for job in jobs]
+            try:
+                for future in as_completed(futures):
+                    finished.append(future.result())
+            except BaseException:
+                # 任务被取消或主线程收到 Ctrl-C：其他任务在下一个检查点停下，线程池退出时等它们收尾
+                if not control.cancelled:
+                    control.cancel()
+                raise
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+    return finished
@@ -0,0 +1,34 @@
+import threading
+from collections import deque
+
+# 工作线程 → 界面的限频通道：转换线程只往通道里记录（加锁追加，不等界面），
+# 界面按固定频率取走累积的更新，一次刷新进度条和日志，每秒最多刷新 N 次
+DEFAULT_MAX_LOGS = 1000
+
+class Telemetry:
+    """进度只保留最新值，日志放进固定长度的环形缓冲区（界面来不及显示时丢弃最旧的并计数）"""
+
+    def __init__(self, max_logs=DEFAULT_MAX_LOGS):
+        self._logs = deque(maxlen=max_logs)
+        self._dropped = 0
+        self._progress = None
+        self._lock = threading.Lock()
+
+    def log(self, message):
+        with self._lock:
+            if len(self._logs) == self._logs.maxlen:
+                self._dropped += 1
+            self._logs.append(message)
+
+    def progress(self, percent):
+        with self._lock:
+            self._progress = percent  # 只保留最新值
+
+    def drain(self):
+        """取走累积的更新：(最新进度或 None, 日志列表, 被丢弃的日志条数)"""
+        with self._lock:
+            logs = list(self._logs)
+            self._logs.clear()
+            dropped, self._dropped = self._dropped, 0
+            percent, self._progress = self._progress, None
+        return percent, logs, dropped
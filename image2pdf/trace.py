@@ -0,0 +1,173 @@
+import os
+import csv
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+# 阶段计时：每个阶段记录墙钟时间、CPU 时间和处理字节数，通过可插拔的 sink 输出
+# 事件字典：stage, ts（perf_counter 秒）, wall, cpu, bytes, pid, tid, 以及调用方附带的参数（如 file）
+
+class Tracer:
+    """收集阶段事件并分发给 sink；sink 是接收事件字典的可调用对象"""
+
+    enabled = True
+
+    def __init__(self, *sinks):
+        self.sinks = list(sinks)
+
+    @contextmanager
+    def span(self, stage, **args):
+        """计时一个阶段；可在 with 块内设置 record['bytes']"""
+        record = dict(args)
+        record['bytes'] = 0
+        start_cpu = time.thread_time()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['wall'] = time.perf_counter() - start
+            record['cpu'] = time.thread_time() - start_cpu
+            record['stage'] = stage
+            record['ts'] = start
+            record['pid'] = os.getpid()
+            record['tid'] = threading.get_ident()
+            self.emit(record)
+
+    def emit(self, event):
+        for sink in self.sinks:
+            sink(event)
+
+    def close(self):
+        for sink in self.sinks:
+            close = getattr(sink, 'close', None)
+            if close:
+                close()
+
+class NullTracer:
+    """未启用计时时使用，span 几乎没有开销"""
+
+    enabled = False
+    _scratch = {}
+
+    def span(self, stage, **args):
+        return nullcontext(self._scratch)
+
+    def emit(self, event):
+        pass
+
+    def close(self):
+        pass
+
+NULL_TRACER = NullTracer()
+
+class JsonLinesSink:
+    """每个事件写一行 JSON"""
+
+    def __init__(self, path):
+        self._file = open(path, 'w', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def close(self):
+        self._file.close()
+
+class ChromeTraceSink:
+    """写出 Chrome trace-event 格式（chrome://tracing、Perfetto 可直接打开）"""
+
+    def __init__(self, path):
+        self.path = path
+        self._events = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def __call__(self, event):
+        args = {k: v for k, v in event.items() if k not in ('stage', 'ts', 'wall', 'pid', 'tid')}
+        trace_event = {
+            'name': event['stage'], 'ph': 'X', 'cat': 'image2pdf',
+            'ts': round((event['ts'] - self._origin) * 1e6, 1),
+            'dur': round(event['wall'] * 1e6, 1),
+            'pid': event['pid'], 'tid': event['tid'], 'args': args,
+        }
+        with self._lock:
+            self._events.append(trace_event)
+
+    def close(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self._events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False, default=str)
+
+class StageSummary:
+    """按阶段累计次数、墙钟时间、CPU 时间和字节数"""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            total = self.stages.setdefault(event['stage'], {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'bytes': 0})
+            total['count'] += 1
+            total['wall'] += event['wall']
+            total['cpu'] += event['cpu']
+            total['bytes'] += event.get('bytes') or 0
+
+    def report(self):
+        """按墙钟时间从高到低排列的文本表格"""
+        lines = [f"{'阶段':<14}{'次数':>8}{'墙钟(秒)':>12}{'CPU(秒)':>12}{'MB':>10}"]
+        for stage, total in sorted(self.stages.items(), key=lambda item: -item[1]['wall']):
+            lines.append(f"{stage:<16}{total['count']:>8}{total['wall']:>12.3f}{total['cpu']:>12.3f}"
+                         f"{total['bytes'] / 1e6:>10.1f}")
+        return '\n'.join(lines)
+
+class EncodeReport:
+    """逐张记录重新编码的耗时和输出大小（encode 事件），可同时写出 CSV，结束时按编码方式汇总"""
+
+    FIELDS = ('file', 'codec', 'pixels', 'seconds', 'bytes')
+
+    def __init__(self, path=None):
+        self.codecs = {}
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            # utf-8-sig：Windows 上用 Excel 打开中文文件名不乱码
+            self._file = open(path, 'w', encoding='utf-8-sig', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.FIELDS)
+
+    def __call__(self, event):
+        if event['stage'] != 'encode':
+            return
+        codec = event.get('codec', '?')
+        with self._lock:
+            total = self.codecs.setdefault(codec, {'count': 0, 'seconds': 0.0, 'bytes': 0, 'pixels': 0})
+            total['count'] += 1
+            total['seconds'] += event['wall']
+            total['bytes'] += event['bytes']
+            total['pixels'] += event.get('pixels') or 0
+            if self._file is not None:
+                self._writer.writerow((event.get('file'), codec, event.get('pixels'),
+                                       round(event['wall'], 6), event['bytes']))
+
+    def report(self):
+        """每种编码方式的张数、总耗时、平均每张耗时、输出大小和每像素字节数"""
+        lines = [f"{'编码':<8}{'张数':>8}{'耗时(秒)':>12}{'毫秒/张':>10}{'MB':>10}{'字节/像素':>10}"]
+        for codec, total in sorted(self.codecs.items()):
+            per_image = total['seconds'] / total['count'] * 1000
+            per_pixel = total['bytes'] / total['pixels'] if total['pixels'] else 0
+            lines.append(f"{codec:<10}{total['count']:>8}{total['seconds']:>12.3f}{per_image:>12.1f}"
+                         f"{total['bytes'] / 1e6:>10.1f}{per_pixel:>14.3f}")
+        return '\n'.join(lines)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+def open_trace_sink(path):
+    """按扩展名选择 sink：.json 为 Chrome trace-event，其余为 JSON-lines"""
+    if path.lower().endswith('.json'):
+        return ChromeTraceSink(path)
+    return JsonLinesSink(path)
@@ -0,0 +1,27 @@
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+# 仓库没有打包配置，直接从源码目录导入 image2pdf
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def jpeg_bytes(width, height, color='red'):
+    """生成一张纯色 JPEG 的原始字节"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+@pytest.fixture
+def image_folder(tmp_path):
+    """6 张宽度各不相同的 JPEG（页面宽度可用来核对页序），返回按顺序排列的文件路径"""
+    folder = tmp_path / 'images'
+    folder.mkdir()
+    image_files = []
+    for index in range(6):
+        path = folder / f'page{index + 1}.jpg'
+        path.write_bytes(jpeg_bytes(100 + index * 10, 80, ('red', 'green', 'blue')[index % 3]))
+        image_files.append(str(path))
+    return image_files
@@ -0,0 +1,160 @@
+import os
+
+import pytest
+from PyPDF2 import PdfReader
+
+from conftest import jpeg_bytes
+from image2pdf.checkpoint import CHECKPOINT_SUFFIX, PART_SUFFIX, Checkpoint
+from image2pdf.control import ConversionCancelled, ConversionControl
+from image2pdf.core import stream_folder
+from image2pdf.pdfwriter import PdfImage, PdfStreamWriter
+
+def page_widths(path):
+    reader = PdfReader(str(path), strict=True)
+    return [float(page.mediabox.width) for page in reader.pages]
+
+def expected_widths(image_files):
+    """conftest 里第 i 张图宽 100 + 10i 像素，默认 100 DPI"""
+    return [(100 + index * 10) * 72 / 100 for index in range(len(image_files))]
+
+def cancel_after(control, count, total, keep_partial=True):
+    """处理完 count 张后取消的进度回调"""
+    def progress(percent):
+        if round(percent * total / 100) >= count:
+            control.cancel(keep_partial)
+    return progress
+
+def convert(image_files, output, log=None, **kwargs):
+    return stream_folder(image_files, str(output), log_callback=(log.append if log is not None else lambda m: None),
+                         **kwargs)
+
+def test_cancel_then_resume(tmp_path, image_folder):
+    output = tmp_path / 'out.pdf'
+    control = ConversionControl()
+    with pytest.raises(ConversionCancelled):
+        convert(image_folder, output, checkpoint_every=2, control=control,
+                progress_callback=cancel_after(control, 3, len(image_folder)))
+    assert not output.exists()
+    assert os.path.exists(f'{output}{PART_SUFFIX}')
+    assert os.path.exists(f'{output}{CHECKPOINT_SUFFIX}')
+
+    log = []
+    assert convert(image_folder, output, log, checkpoint_every=2) == 6
+    assert any('跳过已完成的 3 张' in message for message in log)
+    assert page_widths(output) == expected_widths(image_folder)
+    assert not os.path.exists(f'{output}{PART_SUFFIX}')
+    assert not os.path.exists(f'{output}{CHECKPOINT_SUFFIX}')
+
+def test_crash_resumes_from_last_checkpoint(tmp_path, image_folder):
+    output = tmp_path / 'out.pdf'
+
+    def crash(percent):
+        if percent >= 50:
+            raise RuntimeError('模拟中断')
+
+    # 第 3 张写完后中断：只有前 2 张记入了断点，第 3 张写了一半的内容续写时被截掉
+    with pytest.raises(RuntimeError):
+        convert(image_folder, output, checkpoint_every=2, progress_callback=crash)
+    log = []
+    assert convert(image_folder, output, log, checkpoint_every=2) == 6
+    assert any('跳过已完成的 2 张' in message for message in log)
+    assert page_widths(output) == expected_widths(image_folder)
+
+def test_changed_input_discards_checkpoint(tmp_path, image_folder):
+    output = tmp_path / 'out.pdf'
+    control = ConversionControl()
+    with pytest.raises(ConversionCancelled):
+        convert(image_folder, output, checkpoint_every=2, control=control,
+                progress_callback=cancel_after(control, 3, len(image_folder)))
+
+    with open(image_folder[0], 'wb') as f:
+        f.write(jpeg_bytes(100, 80, 'white') + b'\0' * 16)
+    log = []
+    assert convert(image_folder, output, log, checkpoint_every=2) == 6
+    assert not any('从断点继续' in message for message in log)
+    assert page_widths(output) == expected_widths(image_folder)
+
+def test_resume_disabled_starts_over(tmp_path, image_folder):
+    output = tmp_path / 'out.pdf'
+    control = ConversionControl()
+    with pytest.raises(ConversionCancelled):
+        convert(image_folder, output, checkpoint_every=2, control=control,
+                progress_callback=cancel_after(control, 3, len(image_folder)))
+    log = []
+    assert convert(image_folder, output, log, checkpoint_every=2, resume=False) == 6
+    assert not any('从断点继续' in message for message in log)
+    assert page_widths(output) == expected_widths(image_folder)
+
+def test_cancel_without_keep_partial_removes_output(tmp_path, image_folder):
+    output = tmp_path / 'out.pdf'
+    control = ConversionControl()
+    with pytest.raises(ConversionCancelled):
+        convert(image_folder, output, checkpoint_every=2, control=control,
+                progress_callback=cancel_after(control, 3, len(image_folder), keep_partial=False))
+    assert not any(name.startswith('out.pdf') for name in os.listdir(tmp_path))
+
+def test_append_resume_in_place(tmp_path, image_folder):
+    output = tmp_path / 'out.pdf'
+    assert convert(image_folder[:3], output) == 3
+    original = output.read_bytes()
+    inode = os.stat(output).st_ino
+
+    control = ConversionControl()
+    with pytest.raises(ConversionCancelled):
+        convert(image_folder[3:], output, append=True, checkpoint_every=1, control=control,
+                progress_callback=cancel_after(control, 1, 3))
+
+    log = []
+    assert convert(image_folder[3:], output, log, append=True, checkpoint_every=1) == 6
+    assert any('跳过已完成的 1 张' in message for message in log)
+    # 原地追加：不复制文件，旧内容原样保留
+    assert os.stat(output).st_ino == inode
+    assert output.read_bytes().startswith(original)
+    assert page_widths(output) == expected_widths(image_folder)
+    assert not os.path.exists(f'{output}{CHECKPOINT_SUFFIX}')
+
+def test_append_cancel_restores_original(tmp_path, image_folder):
+    output = tmp_path / 'out.pdf'
+    convert(image_folder[:3], output)
+    original = output.read_bytes()
+
+    control = ConversionControl()
+    with pytest.raises(ConversionCancelled):
+        convert(image_folder[3:], output, append=True, checkpoint_every=1, control=control,
+                progress_callback=cancel_after(control, 2, 3, keep_partial=False))
+    assert output.read_bytes() == original
+    assert not os.path.exists(f'{output}{CHECKPOINT_SUFFIX}')
+
+def test_checkpoint_records_are_append_only(tmp_path):
+    output = tmp_path / 'out.pdf'
+    checkpoint = Checkpoint(str(output), {'engine': 'stream'})
+    writer = PdfStreamWriter(checkpoint.part_path)
+    image = PdfImage(jpeg_bytes(10, 10), 10, 10, key='same')
+    sizes = []
+    for batch in range(8):
+        for _ in range(20):
+            writer.add_image_page(image)
+        before = os.path.getsize(checkpoint.state_path) if batch else 0
+        checkpoint.save([['f', 1, batch]] * 20, writer.checkpoint())
+        sizes.append(os.path.getsize(checkpoint.state_path) - before)
+    writer.detach()
+    # 每条记录只含这一批的增量，大小不随已完成的页数增长（只有偏移的位数略有增加）
+    assert sizes[-1] < sizes[1] * 1.2
+
+def test_resume_after_several_checkpoints_and_torn_record(tmp_path, image_folder):
+    output = tmp_path / 'out.pdf'
+    control = ConversionControl()
+    with pytest.raises(ConversionCancelled):
+        convert(image_folder, output, checkpoint_every=1, control=control,
+                progress_callback=cancel_after(control, 4, len(image_folder)))
+    # 模拟写最后一条记录时断电：只剩半行
+    with open(f'{output}{CHECKPOINT_SUFFIX}', 'rb+') as f:
+        data = f.read()
+        f.seek(0)
+        f.truncate()
+        f.write(data[:-10])
+
+    log = []
+    assert convert(image_folder, output, log, checkpoint_every=1) == 6
+    assert any('跳过已完成的 3 张' in message for message in log)
+    assert page_widths(output) == expected_widths(image_folder)
@@ -0,0 +1,38 @@
+import os
+
+from conftest import jpeg_bytes
+from image2pdf.dedup import DEFAULT_CACHE_SIZE, ImageCache, reserve_cache_memory
+from image2pdf.images import DEFAULT_OPTIONS
+from image2pdf.pdfwriter import PdfImage
+from image2pdf.scheduler import plan_jobs, run_jobs
+
+def test_cache_counts_against_memory_budget():
+    cache = ImageCache()
+    assert reserve_cache_memory(cache, None) is None
+    assert cache.max_bytes == DEFAULT_CACHE_SIZE
+
+    # 预算 512MB：缓存压到 128MB，在途图片只剩 384MB，两者加起来不超过预算
+    assert reserve_cache_memory(cache, 512 << 20) == 384 << 20
+    assert cache.max_bytes == 128 << 20
+    # 预算比默认上限宽裕时不会调大缓存
+    assert reserve_cache_memory(ImageCache(), 4 << 30) == (4 << 30) - DEFAULT_CACHE_SIZE
+    assert reserve_cache_memory(None, 512 << 20) == 512 << 20
+
+def test_shrink_evicts_least_recently_used():
+    cache = ImageCache()
+    images = [PdfImage(jpeg_bytes(10, 10, color), 10, 10) for color in ('red', 'green', 'blue')]
+    for index, image in enumerate(images):
+        cache.put(str(index), DEFAULT_OPTIONS, image)
+    cache.get('0', DEFAULT_OPTIONS)
+    cache.shrink(images[0].length + images[2].length)
+    assert cache.get('1', DEFAULT_OPTIONS) is None
+    assert cache.get('0', DEFAULT_OPTIONS) is images[0]
+    assert cache.get('2', DEFAULT_OPTIONS) is images[2]
+
+def test_run_jobs_caps_cache_from_max_memory(tmp_path, image_folder):
+    cache = ImageCache()
+    jobs = plan_jobs([(os.path.dirname(image_folder[0]), str(tmp_path / 'images.pdf'))], ['.jpg'],
+                     log_callback=lambda m: None)
+    finished = run_jobs(jobs, max_memory=8 << 20, cache=cache, log_callback=lambda m: None)
+    assert finished[0].success
+    assert cache.max_bytes == 2 << 20
@@ -0,0 +1,46 @@
+import io
+
+import pytest
+
+from conftest import jpeg_bytes
+from image2pdf.images import parse_jpeg_info, passthrough_image, read_image_header
+
+def patch_sof(data, marker=None, precision=None):
+    """改写 JPEG 的 SOF 标记或采样精度，模拟无损、算术编码、12 位等 JPEG 的文件头"""
+    data = bytearray(data)
+    pos = data.index(b'\xff\xc0')
+    if marker is not None:
+        data[pos + 1] = marker
+    if precision is not None:
+        data[pos + 4] = precision
+    return bytes(data)
+
+def test_baseline_jpeg_passes_through(tmp_path):
+    data = jpeg_bytes(40, 30)
+    assert parse_jpeg_info(io.BytesIO(data)) == (40, 30, 3, False)
+    image = passthrough_image(data)
+    assert image is not None and image.filter == b'/DCTDecode'
+
+    path = tmp_path / 'a.jpg'
+    path.write_bytes(data)
+    assert read_image_header(str(path)).passthrough
+
+@pytest.mark.parametrize('marker, precision', [
+    (0xC3, None),  # 无损
+    (0xC5, None),  # 分层
+    (0xC9, None),  # 算术编码
+    (0xCA, None),  # 算术编码渐进式
+    (0xC1, 12),    # 12 位
+])
+def test_unsupported_jpeg_is_not_passed_through(tmp_path, marker, precision):
+    data = patch_sof(jpeg_bytes(40, 30), marker, precision)
+    assert parse_jpeg_info(io.BytesIO(data)) is None
+    assert passthrough_image(data) is None
+
+    path = tmp_path / 'a.jpg'
+    path.write_bytes(data)
+    try:
+        header = read_image_header(str(path))
+    except Exception:
+        return  # Pillow 也读不了这个文件头时交给解码时报错
+    assert not header.passthrough
@@ -0,0 +1,138 @@
+import hashlib
+
+from PyPDF2 import PdfReader
+
+from conftest import jpeg_bytes
+from image2pdf.pdfwriter import PdfImage, PdfStreamWriter
+
+def jpeg_image(width, height, color='red', key=None):
+    return PdfImage(jpeg_bytes(width, height, color), width, height, key=key)
+
+def read_pdf(path):
+    """用 PyPDF2 严格模式解析，返回各页宽度（点）"""
+    reader = PdfReader(str(path), strict=True)
+    return [float(page.mediabox.width) for page in reader.pages]
+
+def file_md5(path):
+    return hashlib.md5(path.read_bytes()).hexdigest()
+
+def test_fresh_write(tmp_path):
+    output = tmp_path / 'out.pdf'
+    writer = PdfStreamWriter(str(output))
+    for width in (100, 200, 300):
+        writer.add_image_page(jpeg_image(width, 50))
+    writer.close()
+
+    assert writer.page_count == 3
+    # 默认 100 DPI：页面宽度 = 像素 / 100 英寸
+    assert read_pdf(output) == [72.0, 144.0, 216.0]
+
+def test_page_size_follows_image_dpi(tmp_path):
+    output = tmp_path / 'out.pdf'
+    image = jpeg_image(300, 150)
+    image.dpi = 300
+    with PdfStreamWriter(str(output)) as writer:
+        writer.add_image_page(image)
+    assert read_pdf(output) == [72.0]
+
+def test_append_is_incremental_update(tmp_path):
+    output = tmp_path / 'out.pdf'
+    with PdfStreamWriter(str(output)) as writer:
+        writer.add_image_page(jpeg_image(100, 50))
+        writer.add_image_page(jpeg_image(200, 50))
+    original = output.read_bytes()
+
+    writer = PdfStreamWriter(str(output), append=True)
+    assert writer.page_count == 2
+    writer.add_image_page(jpeg_image(300, 50))
+    writer.close()
+
+    # 增量更新只在末尾追加，原文件内容原样保留，新 trailer 通过 /Prev 指向旧 xref
+    data = output.read_bytes()
+    assert data.startswith(original)
+    assert b'/Prev ' in data[len(original):]
+    assert read_pdf(output) == [72.0, 144.0, 216.0]
+
+    # 追加过的文件可以再次追加
+    with PdfStreamWriter(str(output), append=True) as writer:
+        writer.add_image_page(jpeg_image(400, 50))
+    assert read_pdf(output) == [72.0, 144.0, 216.0, 288.0]
+
+def test_abort_append_truncates_to_original(tmp_path):
+    output = tmp_path / 'out.pdf'
+    with PdfStreamWriter(str(output)) as writer:
+        writer.add_image_page(jpeg_image(100, 50))
+    before = file_md5(output)
+
+    writer = PdfStreamWriter(str(output), append=True)
+    writer.add_image_page(jpeg_image(200, 50))
+    writer.abort()
+    assert file_md5(output) == before
+
+def test_abort_new_file_removes_it(tmp_path):
+    output = tmp_path / 'out.pdf'
+    writer = PdfStreamWriter(str(output))
+    writer.add_image_page(jpeg_image(100, 50))
+    writer.abort()
+    assert not output.exists()
+
+def test_resume_discards_writes_after_checkpoint(tmp_path):
+    output = tmp_path / 'out.pdf'
+    writer = PdfStreamWriter(str(output))
+    writer.add_image_page(jpeg_image(100, 50))
+    writer.add_image_page(jpeg_image(200, 50))
+    state = writer.checkpoint()
+    writer.add_image_page(jpeg_image(999, 50))  # 断点之后、中断之前写入的页面
+    writer.detach()
+
+    writer = PdfStreamWriter.resume(str(output), state)
+    assert writer.page_count == 2
+    writer.add_image_page(jpeg_image(300, 50))
+    writer.close()
+    assert read_pdf(output) == [72.0, 144.0, 216.0]
+
+def test_resume_append(tmp_path):
+    output = tmp_path / 'out.pdf'
+    with PdfStreamWriter(str(output)) as writer:
+        writer.add_image_page(jpeg_image(100, 50))
+    original = output.read_bytes()
+
+    writer = PdfStreamWriter(str(output), append=True)
+    writer.add_image_page(jpeg_image(200, 50))
+    state = writer.checkpoint()
+    writer.add_image_page(jpeg_image(999, 50))
+    writer.detach()
+
+    writer = PdfStreamWriter.resume(str(output), state)
+    writer.add_image_page(jpeg_image(300, 50))
+    writer.close()
+    assert output.read_bytes().startswith(original)
+    assert read_pdf(output) == [72.0, 144.0, 216.0]
+
+def test_duplicate_images_share_one_xobject(tmp_path):
+    output = tmp_path / 'out.pdf'
+    with PdfStreamWriter(str(output)) as writer:
+        for _ in range(3):
+            writer.add_image_page(jpeg_image(100, 50, key='same'))
+        writer.add_image_page(jpeg_image(100, 50, color='blue', key='other'))
+    assert writer.shared_images == 2
+
+    reader = PdfReader(str(output), strict=True)
+    xobjects = [page['/Resources']['/XObject'] for page in reader.pages]
+    refs = [next(iter(x.values())).idnum for x in xobjects]
+    assert refs[0] == refs[1] == refs[2] != refs[3]
+
+def test_resume_forgets_images_written_after_checkpoint(tmp_path):
+    output = tmp_path / 'out.pdf'
+    writer = PdfStreamWriter(str(output))
+    writer.add_image_page(jpeg_image(100, 50, key='a'))
+    state = writer.checkpoint()
+    writer.add_image_page(jpeg_image(200, 50, key='b'))  # 续写时被截掉，不能再被引用
+    writer.detach()
+
+    writer = PdfStreamWriter.resume(str(output), state)
+    writer.add_image_page(jpeg_image(200, 50, key='b'))
+    writer.add_image_page(jpeg_image(100, 50, key='a'))
+    writer.close()
+    assert writer.shared_images == 1
+    assert read_pdf(output) == [72.0, 144.0, 72.0]
@@ -0,0 +1,24 @@
+import os
+
+from image2pdf.scheduler import plan_jobs, run_jobs
+
+def test_missing_and_empty_folders_are_reported(tmp_path, image_folder):
+    empty = tmp_path / 'empty'
+    empty.mkdir()
+    outputs = [(os.path.dirname(image_folder[0]), str(tmp_path / 'images.pdf')),
+               (str(tmp_path / 'missing'), str(tmp_path / 'missing.pdf')),
+               (str(empty), str(tmp_path / 'empty.pdf'))]
+    jobs = plan_jobs(outputs, ['.jpg'], log_callback=lambda m: None)
+    assert [(job.name, job.action, job.success) for job in jobs] == [
+        ('images', 'build', None), ('missing', 'missing', False), ('empty', 'empty', False)]
+
+    finished = run_jobs(jobs, log_callback=lambda m: None)
+    assert {job.name: (job.action, job.success) for job in finished} == {
+        'images': ('build', True), 'missing': ('missing', False), 'empty': ('empty', False)}
+    assert not os.path.exists(tmp_path / 'missing.pdf')
+    assert not os.path.exists(tmp_path / 'empty.pdf')
+
+def test_only_missing_folders_do_nothing(tmp_path):
+    jobs = plan_jobs([(str(tmp_path / 'missing'), str(tmp_path / 'missing.pdf'))], ['.jpg'],
+                     log_callback=lambda m: None)
+    assert run_jobs(jobs, workers=4, log_callback=lambda m: None) == jobs